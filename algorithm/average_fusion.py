@@ -2,4 +2,4 @@ import numpy as np
 
 
 def average_fusion(expert_advice):
-    return np.sum(expert_advice, axis=0) / 3
\ No newline at end of file
+    return np.sum(expert_advice, axis=-2) / expert_advice.shape[-2]
\ No newline at end of file
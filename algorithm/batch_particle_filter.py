@@ -0,0 +1,88 @@
+import numpy as np
+
+from algorithm.particle_filter import standard_normal_into
+from algorithm.previous_position import batch_direction_probs
+from algorithm.sampling import Resampler
+
+
+class BatchParticleFilter:
+    """B independent ParticleFilters advanced together; particles are (B, 2, P).
+
+    `rng` is one generator for the whole batch, or a list of per-filter generators, in which case
+    filter b draws from rng[b] exactly what a ParticleFilter with the same settings would. Every
+    step draws noise and resampling uniforms for all filters and resamples those whose effective
+    sample size fell below the threshold in one pass. particle_filter returns the (B, 4) advice block.
+    """
+
+    def __init__(self, num_particles, uav_positions, rng=np.random, resampling='systematic', noise_std=10,
+                 ess_threshold=0.5, dtype=np.float64):
+        uav_positions = np.asarray(uav_positions)
+        batch_size = len(uav_positions)
+        self.num_particles = num_particles
+        self.rng = rng
+        self.noise_std = noise_std
+        self.ess_threshold = ess_threshold
+        self.particles = np.empty((batch_size, 2, num_particles), dtype=dtype)
+        self.particles[:] = uav_positions[:, :, None]
+        self.log_weights = np.full((batch_size, num_particles), -np.log(num_particles), dtype=dtype)
+        self.weights = np.full((batch_size, num_particles), 1 / num_particles, dtype=dtype)
+        # A shared generator still gives every filter its own resampling uniforms
+        lane_rngs = rng if isinstance(rng, (list, tuple)) else [rng] * batch_size
+        self.resampler = Resampler(resampling, lane_rngs, block_size=4 * num_particles)
+        self.resample_count = np.zeros(batch_size, dtype=int)
+
+        # Work buffers reused every frame
+        self.noise = np.empty_like(self.particles)
+        self.distances = np.empty_like(self.weights)
+        self.scratch = np.empty_like(self.particles)
+
+    def predict(self):
+        if isinstance(self.rng, (list, tuple)):
+            for rng, noise in zip(self.rng, self.noise):
+                standard_normal_into(rng, noise)
+        else:
+            standard_normal_into(self.rng, self.noise)
+        self.noise *= self.noise_std
+        self.particles += self.noise
+
+    def update(self, target_positions):
+        np.subtract(self.particles, target_positions[:, :, None], out=self.scratch)
+        np.multiply(self.scratch, self.scratch, out=self.scratch)
+        np.add(self.scratch[:, 0], self.scratch[:, 1], out=self.distances)
+        np.sqrt(self.distances, out=self.distances)
+        self.log_weights -= self.distances
+
+        self.log_weights -= self.log_weights.max(axis=1, keepdims=True)
+        np.exp(self.log_weights, out=self.weights)
+        total = self.weights.sum(axis=1, keepdims=True)
+        self.weights /= total
+        self.log_weights -= np.log(total)
+
+    def effective_sample_size(self):
+        return 1 / np.square(self.weights).sum(axis=1)
+
+    def resample(self, lanes, positions):
+        n = self.num_particles
+        indices = self.resampler.indices(self.weights[lanes], positions[lanes])
+        self.particles[lanes] = np.take_along_axis(self.particles[lanes], indices[:, None, :], axis=2)
+        self.log_weights[lanes] = -np.log(n)
+        self.weights[lanes] = 1 / n
+        self.resample_count[lanes] += 1
+
+    def estimate(self):
+        np.multiply(self.particles, self.weights[:, None, :], out=self.scratch)
+        return self.scratch.sum(axis=2)
+
+    def step(self, target_positions):
+        self.predict()
+        self.update(target_positions)
+        estimated_positions = self.estimate()
+        positions = self.resampler.positions(self.num_particles)
+        lanes = np.flatnonzero(self.effective_sample_size() < self.ess_threshold * self.num_particles)
+        if len(lanes):
+            self.resample(lanes, positions)
+        return estimated_positions
+
+    def particle_filter(self, target, uav):
+        estimated_positions = self.step(target.target_position)
+        return batch_direction_probs(estimated_positions, uav.uav_position, uav.uav_orientation, uav.target_in_view)
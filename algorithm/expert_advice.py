@@ -0,0 +1,37 @@
+import numpy as np
+
+from algorithm.particle_filter import ParticleFilter
+from algorithm.previous_position import previous_position
+from algorithm.trajectory_prediction import TrajectoryPredictor
+
+EXPERTS = ['Previous Position Algorithm', 'Particle Filtering Algorithm', 'Trajectory Fitting Algorithm']
+
+
+class ExpertAdvice:
+    """M x k advice matrix of one UAV, filled every frame into a reusable buffer.
+
+    Only the experts the policy reads are run. The advice cannot be shared between policies: each
+    policy moves its own UAV, so from the first frame on no two policies see the same state. With
+    batch_size the buffer is (batch_size, M, k) and the experts are expected to return (batch_size, k)
+    blocks.
+    """
+
+    def __init__(self, experts, k=4, batch_size=None):
+        self.experts = experts
+        shape = (len(experts), k) if batch_size is None else (batch_size, len(experts), k)
+        self.advice = np.zeros(shape)
+
+    def compute(self, target, uav, experts):
+        for m in experts:
+            self.advice[..., m, :] = self.experts[m](target, uav)
+        return self.advice
+
+
+def build_experts(uav, target, rng=np.random, num_particles=1000):
+    # Experts only run when a policy reads their advice (ExpertAdvice.compute), and the particle filter
+    # draws from rng in those frames only: on a shared generator such as np.random the stream consumed
+    # by an episode, and so what later episodes draw, depends on the policy
+    pf = ParticleFilter(num_particles=num_particles, uav_position=uav.uav_position,
+                        uav_orientation=target.target_position, rng=rng)
+    tp = TrajectoryPredictor()
+    return ExpertAdvice([previous_position, pf.particle_filter, tp.trajectory_prediction])
@@ -1,41 +1,94 @@
 import numpy as np
 
+from algorithm.sampling import Resampler
+
+
+def standard_normal_into(rng, out):
+    # Generator writes in place; the legacy RandomState / np.random API can only return a new array
+    if isinstance(rng, np.random.Generator):
+        rng.standard_normal(out=out, dtype=out.dtype)
+    else:
+        out[...] = rng.standard_normal(out.shape)
+    return out
+
 
 class ParticleFilter:
-    def __init__(self, num_particles, uav_position, uav_orientation):
+    """Bootstrap particle filter of the target position.
+
+    Every frame each particle moves by fresh N(0, noise_std^2) noise and its log weight drops by
+    its distance to the target. The particles are resampled (and the weights reset to uniform)
+    only when the effective sample size 1 / sum(w^2) falls below ess_threshold * num_particles;
+    the resampling uniforms are drawn every frame regardless, so the random stream does not depend
+    on those decisions (see algorithm.batch_particle_filter). All per-frame work happens in
+    preallocated buffers of the given dtype; particles is stored as (2, num_particles) so each
+    coordinate is contiguous.
+    """
+
+    def __init__(self, num_particles, uav_position, uav_orientation, rng=np.random, resampling='systematic',
+                 noise_std=10, ess_threshold=0.5, dtype=np.float64):
         self.num_particles = num_particles
-        self.particles = np.tile(uav_position, (num_particles, 1))
-        self.weights = np.ones(num_particles) / num_particles
+        self.rng = rng
+        self.noise_std = noise_std
+        self.ess_threshold = ess_threshold
+        self.particles = np.empty((2, num_particles), dtype=dtype)
+        self.particles[:] = np.reshape(uav_position, (2, 1))
+        self.log_weights = np.full(num_particles, -np.log(num_particles), dtype=dtype)
+        self.weights = np.full(num_particles, 1 / num_particles, dtype=dtype)
         self.uav_orientation = uav_orientation
-        self.noise = np.random.randn(self.num_particles, 2) * 10
+        self.resampler = Resampler(resampling, rng, block_size=4 * num_particles)
+        self.resample_count = 0
+
+        # Work buffers reused every frame
+        self.noise = np.empty((2, num_particles), dtype=dtype)
+        self.distances = np.empty(num_particles, dtype=dtype)
+        self.scratch = np.empty((2, num_particles), dtype=dtype)
 
-    def predict(self):  # 适当减少噪声
+    def predict(self):
+        standard_normal_into(self.rng, self.noise)
+        self.noise *= self.noise_std
         self.particles += self.noise
 
     def update(self, target):
-        distances = np.linalg.norm(self.particles - target.target_position, axis=1)
-        self.weights = np.exp(-distances)
-        self.weights += 1.e-300
-        self.weights /= np.sum(self.weights)
+        np.subtract(self.particles, np.reshape(target.target_position, (2, 1)), out=self.scratch)
+        np.multiply(self.scratch, self.scratch, out=self.scratch)
+        np.add(self.scratch[0], self.scratch[1], out=self.distances)
+        np.sqrt(self.distances, out=self.distances)
+        self.log_weights -= self.distances
+
+        # Normalise in log space, so far-away clouds do not underflow to all-zero weights
+        self.log_weights -= self.log_weights.max()
+        np.exp(self.log_weights, out=self.weights)
+        total = self.weights.sum()
+        self.weights /= total
+        self.log_weights -= np.log(total)
+
+    def effective_sample_size(self):
+        return 1 / np.square(self.weights).sum()
 
-    def resample(self):
-        indices = np.random.choice(range(self.num_particles), self.num_particles, p=self.weights)
-        self.particles = self.particles[indices]
-        self.weights = self.weights[indices]
-        self.weights /= np.sum(self.weights)
+    def resample(self, positions=None):
+        indices = self.resampler.indices(self.weights, positions)
+        np.take(self.particles, indices, axis=1, out=self.scratch)
+        self.particles, self.scratch = self.scratch, self.particles
+        self.log_weights.fill(-np.log(self.num_particles))
+        self.weights.fill(1 / self.num_particles)
+        self.resample_count += 1
 
     def estimate(self):
-        return np.average(self.particles, weights=self.weights, axis=0)
+        np.multiply(self.particles, self.weights, out=self.scratch)
+        return self.scratch.sum(axis=1)
 
     def particle_filter(self, target, uav):
         self.predict()
         self.update(target)
-        self.resample()
+        # Estimate from the weighted cloud; resampling only adds noise to it
         estimated_target_position = self.estimate()
+        positions = self.resampler.positions(self.num_particles)
+        if self.effective_sample_size() < self.ess_threshold * self.num_particles:
+            self.resample(positions)
 
         difference = estimated_target_position - uav.uav_position
 
-        if target.is_target_in_view(target, uav):
+        if uav.target_in_view:
             probs = np.array([max(0, difference[1]), max(0, -difference[1]),
                               max(0, -difference[0]), max(0, difference[0])])
             probs = probs / probs.sum()
@@ -45,4 +98,4 @@ class ParticleFilter:
             direction_probs /= direction_probs.sum()
             return direction_probs
 
-        return probs
\ No newline at end of file
+        return probs
@@ -4,7 +4,7 @@ import numpy as np
 def previous_position(target, uav):
     difference = target.target_position - uav.uav_position
 
-    if target.is_target_in_view(target, uav):
+    if uav.target_in_view:
         # Calculate probabilities based on the target's position relative to the drone
         probs = np.array([max(0, difference[1]), max(0, -difference[1]),
                           max(0, -difference[0]), max(0, difference[0])])
@@ -17,3 +17,20 @@ def previous_position(target, uav):
         return direction_probs
 
     return probs
+
+
+def batch_direction_probs(estimated_positions, uav_positions, uav_orientations, valid):
+    """Batched form of the probability rule shared by every expert in algorithm/."""
+    n = len(uav_positions)
+    direction_probs = np.full((n, 4), 0.5)
+    direction_probs[np.arange(n), uav_orientations] += 1.0
+    direction_probs /= direction_probs.sum(axis=1, keepdims=True)
+
+    difference = estimated_positions[valid] - uav_positions[valid]
+    probs = np.maximum(np.stack((difference[:, 1], -difference[:, 1], -difference[:, 0], difference[:, 0]), axis=1), 0)
+    direction_probs[valid] = probs / probs.sum(axis=1, keepdims=True)
+    return direction_probs
+
+
+def batch_previous_position(target, uav):
+    return batch_direction_probs(target.target_position, uav.uav_position, uav.uav_orientation, uav.target_in_view)
@@ -0,0 +1,95 @@
+from bisect import bisect_right
+from itertools import accumulate
+
+import numpy as np
+
+RESAMPLING_METHODS = ('multinomial', 'systematic', 'stratified')
+
+
+class UniformStream:
+    """Uniform numbers served from pre-drawn blocks instead of one generator call per sample.
+
+    `rng` is either one generator or a list of per-episode generators; with a list every draw has
+    a leading episode axis and each generator is consumed exactly as the single-generator case would.
+    """
+
+    def __init__(self, rng=np.random, block_size=1024):
+        self.rng = rng
+        self.block_size = block_size
+        self.block = None
+        self.position = 0
+
+    def refill(self, size):
+        if isinstance(self.rng, (list, tuple)):
+            self.block = np.stack([rng.random(size) for rng in self.rng])
+        else:
+            self.block = self.rng.random(size)
+        self.position = 0
+
+    def draw(self):
+        if self.block is None or self.position == self.block.shape[-1]:
+            self.refill(self.block_size)
+        u = self.block[self.position] if self.block.ndim == 1 else self.block[:, self.position]
+        self.position += 1
+        return u
+
+    def draw_many(self, n):
+        # Leftovers shorter than n are dropped, which keeps every draw a contiguous view
+        if self.block is None or self.position + n > self.block.shape[-1]:
+            self.refill(max(self.block_size, n))
+        u = self.block[..., self.position:self.position + n]
+        self.position += n
+        return u
+
+
+def searchsorted_rows(cdf, values):
+    # cdf rows are normalized to end at 1 and values lie in [0, 1): shifting row b by b keeps the
+    # raveled (B, n) cdf sorted, so one search covers the whole batch
+    if cdf.ndim == 1:
+        return cdf.searchsorted(values, side='right')
+    offsets = np.arange(len(cdf))[:, None]
+    indices = np.searchsorted((cdf + offsets).ravel(), values + offsets, side='right')
+    return indices - offsets * cdf.shape[1]
+
+
+class ActionSampler:
+    """Inverse-CDF draw of integer action codes from per-frame probability vectors."""
+
+    def __init__(self, rng=np.random, block_size=1024):
+        self.uniforms = UniformStream(rng, block_size)
+
+    def sample(self, probs):
+        u = self.uniforms.draw()
+        if probs.ndim == 1:
+            cdf = list(accumulate(probs.tolist()))
+            return min(bisect_right(cdf, u * cdf[-1]), len(cdf) - 1)
+        cdf = np.cumsum(probs, axis=1)
+        actions = (cdf <= u[:, None] * cdf[:, -1:]).sum(axis=1)
+        return np.minimum(actions, probs.shape[1] - 1)
+
+
+class Resampler:
+    """Particle indices for multinomial, systematic or stratified resampling."""
+
+    def __init__(self, method='multinomial', rng=np.random, block_size=4096):
+        if method not in RESAMPLING_METHODS:
+            raise ValueError(f"Unknown resampling method {method!r}, expected one of {RESAMPLING_METHODS}")
+        self.method = method
+        self.uniforms = UniformStream(rng, block_size)
+
+    def positions(self, n):
+        """Draw the sorted (systematic, stratified) or unsorted (multinomial) CDF positions of n particles."""
+        if self.method == 'systematic':
+            return (np.arange(n) + self.uniforms.draw()[..., None]) / n
+        if self.method == 'stratified':
+            return (np.arange(n) + self.uniforms.draw_many(n)) / n
+        return self.uniforms.draw_many(n)
+
+    def indices(self, weights, positions=None):
+        # positions drawn in advance let callers consume the stream even in frames they do not resample
+        n = weights.shape[-1]
+        cdf = np.cumsum(weights, axis=-1)
+        cdf /= cdf[..., -1:]
+        if positions is None:
+            positions = self.positions(n)
+        return np.minimum(searchsorted_rows(cdf, positions), n - 1)
@@ -1,37 +1,122 @@
 import numpy as np
-from scipy.interpolate import interp1d
-
-def trajectory_prediction(target, uav):
-    estimated_target_position = predict_next_position(uav.view_target_trajectory)
-    if estimated_target_position is None:
-        direction_probs = np.array([0.5, 0.5, 0.5, 0.5])
-        direction_probs[uav.uav_orientation] += 1.0
-        direction_probs /= direction_probs.sum()  # Normalize to probabilities
-        return direction_probs
-    difference = estimated_target_position - uav.uav_position
-    probs = np.array([max(0, difference[1]), max(0, -difference[1]),
-                      max(0, -difference[0]), max(0, difference[0])])
-    probs = probs / probs.sum()
-    return probs
-
-def predict_next_position(positions):
-    valid_positions = [(i, pos) for i, pos in enumerate(positions) if pos is not None]
-    if len(valid_positions) < 2:
-        return None
-    indices, coords = zip(*valid_positions)
-
-    # 将索引和对应的x, y坐标分别提取出来
-    indices = np.array(indices)
-    x_coords = np.array([coord[0] for coord in coords])
-    y_coords = np.array([coord[1] for coord in coords])
-
-    # 创建线性插值函数
-    x_interp = interp1d(indices, x_coords, fill_value="extrapolate")
-    y_interp = interp1d(indices, y_coords, fill_value="extrapolate")
-
-    # 预测下一点位置
-    next_index = len(positions)
-    next_x = x_interp(next_index)
-    next_y = y_interp(next_index)
-
-    return np.array([next_x, next_y])
+
+from algorithm.previous_position import batch_direction_probs
+
+PREDICTION_MODES = ('linear', 'constant_acceleration', 'least_squares')
+
+
+def linear_extrapolation(index_lo, index_hi, position_lo, position_hi, next_index):
+    # Same arithmetic as interp1d(..., fill_value="extrapolate") through two observations
+    slope = (position_hi - position_lo) / (index_hi - index_lo)
+    return slope * (next_index - index_lo) + position_lo
+
+
+class TrajectoryPredictor:
+    """Extrapolates the target from the visible part of uav.view_target_trajectory.
+
+    Only frames appended since the previous call are read, and the last `window` visible
+    observations are kept in a fixed ring, so each frame costs O(1) (O(window) for
+    'least_squares') instead of rescanning the whole trajectory.
+    """
+
+    def __init__(self, mode='linear', window=10):
+        if mode not in PREDICTION_MODES:
+            raise ValueError(f"Unknown prediction mode {mode!r}, expected one of {PREDICTION_MODES}")
+        self.mode = mode
+        self.window = max(window, 3)
+        self.frame_indices = np.zeros(self.window)
+        self.observations = np.zeros((self.window, 2))
+        self.reset()
+
+    def reset(self):
+        self.num_observations = 0
+        self.cursor = 0
+
+    def observe(self, frame_index, position):
+        i = self.num_observations % self.window
+        self.frame_indices[i] = frame_index
+        self.observations[i] = position
+        self.num_observations += 1
+
+    def consume(self, trajectory):
+        if trajectory.count < self.cursor:
+            self.reset()
+        for frame_index in range(max(self.cursor, trajectory.count - trajectory.capacity), trajectory.count):
+            position, visible = trajectory.entry(frame_index)
+            if visible:
+                self.observe(frame_index, position)
+        self.cursor = trajectory.count
+
+    def latest(self, n):
+        # Last n observations, oldest first
+        order = (self.num_observations - n + np.arange(n)) % self.window
+        return self.frame_indices[order], self.observations[order]
+
+    def predict(self, next_index):
+        if self.num_observations < 2:
+            return None
+
+        if self.mode == 'constant_acceleration' and self.num_observations >= 3:
+            # Quadratic (Lagrange) extrapolation through the last three observations
+            indices, points = self.latest(3)
+            weights = np.ones(3)
+            for j in range(3):
+                for m in range(3):
+                    if m != j:
+                        weights[j] *= (next_index - indices[m]) / (indices[j] - indices[m])
+            return weights @ points
+
+        if self.mode == 'least_squares' and self.num_observations >= 3:
+            indices, points = self.latest(min(self.num_observations, self.window))
+            centered = indices - indices.mean()
+            mean_point = points.mean(axis=0)
+            slope = centered @ (points - mean_point) / (centered @ centered)
+            return mean_point + slope * (next_index - indices.mean())
+
+        (index_lo, index_hi), (position_lo, position_hi) = self.latest(2)
+        return linear_extrapolation(index_lo, index_hi, position_lo, position_hi, next_index)
+
+    def trajectory_prediction(self, target, uav):
+        self.consume(uav.view_target_trajectory)
+        estimated_target_position = self.predict(uav.view_target_trajectory.count)
+        if estimated_target_position is None:
+            direction_probs = np.array([0.5, 0.5, 0.5, 0.5])
+            direction_probs[uav.uav_orientation] += 1.0
+            direction_probs /= direction_probs.sum()  # Normalize to probabilities
+            return direction_probs
+        difference = estimated_target_position - uav.uav_position
+        probs = np.array([max(0, difference[1]), max(0, -difference[1]),
+                          max(0, -difference[0]), max(0, difference[0])])
+        probs = probs / probs.sum()
+        return probs
+
+
+class BatchTrajectoryPredictor:
+    """TrajectoryPredictor in 'linear' mode for (n,) episodes; keeps only the last two visible observations."""
+
+    def __init__(self, n):
+        self.indices = np.zeros((n, 2))
+        self.positions = np.zeros((n, 2, 2))
+        self.counts = np.zeros(n, dtype=int)
+        self.frame = 0
+
+    def observe(self, target_positions, in_view):
+        self.indices[in_view, 0] = self.indices[in_view, 1]
+        self.positions[in_view, 0] = self.positions[in_view, 1]
+        self.indices[in_view, 1] = self.frame
+        self.positions[in_view, 1] = target_positions[in_view]
+        self.counts[in_view] += 1
+        self.frame += 1
+
+    def predict(self):
+        index_lo, index_hi = self.indices[:, 0], self.indices[:, 1]
+        position_lo, position_hi = self.positions[:, 0], self.positions[:, 1]
+        with np.errstate(divide='ignore', invalid='ignore'):
+            predicted = linear_extrapolation(index_lo[:, None], index_hi[:, None], position_lo, position_hi, self.frame)
+        return predicted, self.counts >= 2
+
+    def trajectory_prediction(self, target, uav):
+        # Called every frame of an episode that uses this expert, like the scalar predictor
+        self.observe(target.target_position, uav.target_in_view)
+        predicted_positions, valid = self.predict()
+        return batch_direction_probs(predicted_positions, uav.uav_position, uav.uav_orientation, valid)
@@ -1,8 +1,19 @@
 import math
 import numpy as np
 
+from bandit.q_history import QHistory
+
 class Exp4IX:
-    def __init__(self, n, k, M, delta):
+    """Exp4-IX with weights normalised in log space and preallocated work buffers.
+
+    Q is computed as exp(-eta * S - logsumexp(-eta * S)), which equals the textbook
+    exp(-eta * S) / sum(exp(-eta * S)) but cannot underflow to all zeros on long horizons.
+    get_probs returns an internal buffer that update reuses, so update must follow
+    get_probs with the same E_t in each round. `history` is the QHistory receiving Q every
+    round; by default every round of the n-round horizon is kept in memory.
+    """
+
+    def __init__(self, n, k, M, delta, history=None):
         self.n = n
         self.k = k
         self.M = M
@@ -10,12 +21,20 @@ class Exp4IX:
         self.eta = math.sqrt(2 * (math.log(M) + math.log(k + 1) - math.log(delta)) / (n * k))
         self.gamma = self.eta / 2
         self.Q = np.ones(M) / M  # Initialize Q_1 as a uniform distribution over experts
+        self.log_Q = np.log(self.Q)
         self.S = np.zeros(M)  # Initialize cumulative rewards S_0
-        self.Q_history = [self.Q.copy()]    # List to store history of Q values
+        self.Q_history = QHistory(n + 1, M) if history is None else history
+        self.Q_history.record(self.Q)
+
+        # Work buffers reused every round
+        self.P_t = np.empty(k)
+        self.hat_Y_t = np.empty(k)
+        self.denominator = np.empty(k)
+        self.tilde_Y_t = np.empty(M)
 
     def get_probs(self, E_t):
-        P_t = np.dot(E_t.T, self.Q)
-        return P_t
+        np.dot(E_t.T, self.Q, out=self.P_t)
+        return self.P_t
 
     def reward(self, uav, target):
         difference = target.target_position - uav.uav_position
@@ -25,17 +44,105 @@ class Exp4IX:
         return 0
 
     def update(self, uav, target, E_t):
-        P_t = self.get_probs(E_t)
         A_t = uav.uav_orientation
 
         Y_t = 1 - self.reward(uav, target)
-        reward_vector = np.ones(self.k)
-        reward_vector[A_t] = Y_t
-        hat_Y_t = reward_vector / (P_t + self.gamma)
-        tilde_Y_t = np.dot(E_t, hat_Y_t)
-        self.S += tilde_Y_t
-        self.Q = np.exp(-self.eta * self.S)
-        self.Q /= np.sum(self.Q)
+        self.hat_Y_t.fill(1.0)
+        self.hat_Y_t[A_t] = Y_t
+        np.add(self.P_t, self.gamma, out=self.denominator)
+        self.hat_Y_t /= self.denominator
+        np.dot(E_t, self.hat_Y_t, out=self.tilde_Y_t)
+        self.S += self.tilde_Y_t
+
+        # log Q = -eta * S - logsumexp(-eta * S), shifted by the maximum before exponentiating
+        np.multiply(self.S, -self.eta, out=self.log_Q)
+        self.log_Q -= self.log_Q.max()
+        np.exp(self.log_Q, out=self.Q)
+        total = self.Q.sum()
+        self.Q /= total
+        self.log_Q -= math.log(total)
 
         # Save the current Q values
-        self.Q_history.append(self.Q.copy())
+        self.Q_history.record(self.Q)
+
+
+class BatchExp4IX:
+    """B independent Exp4-IX learners advanced by one set of array operations.
+
+    State is (B, M); advice is a (B, M, k) tensor. n, delta and optionally eta / gamma may be
+    scalars or length-B arrays, so one instance can hold many episodes, a hyperparameter grid
+    (see grid) or both. Like Exp4IX, update must follow get_probs in each round. Q is only
+    recorded when a QHistory with batch_shape=(B,) is passed as `history`.
+    """
+
+    def __init__(self, n, k, M, delta, batch_size=None, eta=None, gamma=None, history=None):
+        batch_size = batch_size or np.broadcast(np.empty(1), n, delta, eta, gamma).size
+        self.k = k
+        self.M = M
+        self.n = np.broadcast_to(n, (batch_size,))
+        self.delta = np.broadcast_to(delta, (batch_size,))
+        if eta is None:
+            # math.* per learner keeps eta bit-identical to the scalar Exp4IX
+            eta = [math.sqrt(2 * (math.log(M) + math.log(k + 1) - math.log(d)) / (n_b * k))
+                   for n_b, d in zip(self.n, self.delta)]
+        self.eta = np.broadcast_to(np.asarray(eta, dtype=float), (batch_size,))[:, None].copy()
+        self.gamma = self.eta / 2 if gamma is None else np.broadcast_to(gamma, (batch_size,))[:, None].copy()
+        self.Q = np.ones((batch_size, M)) / M
+        self.log_Q = np.log(self.Q)
+        self.S = np.zeros((batch_size, M))
+
+        self.P_t = np.empty((batch_size, k))
+        self.hat_Y_t = np.empty((batch_size, k))
+        self.denominator = np.empty((batch_size, k))
+        self.tilde_Y_t = np.empty((batch_size, M))
+        self.total = np.empty((batch_size, 1))
+        self.rows = np.arange(batch_size)
+
+        self.Q_history = history
+        if history is not None:
+            history.record(self.Q)
+
+    @classmethod
+    def grid(cls, n, k, M, deltas, etas=None, repeats=1):
+        """One learner per (delta, eta, repeat) combination, in C order; returns (learner, delta, eta)."""
+        etas = [None] if etas is None else etas
+        delta_grid, eta_index, _ = np.meshgrid(np.asarray(deltas, dtype=float), np.arange(len(etas)),
+                                               np.arange(repeats), indexing='ij')
+        delta_grid, eta_index = delta_grid.ravel(), eta_index.ravel()
+        if etas[0] is None:
+            learner = cls(n, k, M, delta_grid)
+        else:
+            learner = cls(n, k, M, delta_grid, eta=np.asarray(etas, dtype=float)[eta_index])
+        return learner, delta_grid, learner.eta[:, 0]
+
+    def get_probs(self, E_t):
+        np.einsum('bmk,bm->bk', E_t, self.Q, out=self.P_t)
+        return self.P_t
+
+    def update_batch(self, E_t, A_t, rewards):
+        """Advance every learner given its chosen action A_t (B,) and reward (B,)."""
+        self.hat_Y_t.fill(1.0)
+        self.hat_Y_t[self.rows, A_t] = 1 - rewards
+        np.add(self.P_t, self.gamma, out=self.denominator)
+        self.hat_Y_t /= self.denominator
+        np.einsum('bmk,bk->bm', E_t, self.hat_Y_t, out=self.tilde_Y_t)
+        self.S += self.tilde_Y_t
+
+        np.multiply(self.S, -self.eta, out=self.log_Q)
+        self.log_Q -= self.log_Q.max(axis=1, keepdims=True)
+        np.exp(self.log_Q, out=self.Q)
+        np.sum(self.Q, axis=1, keepdims=True, out=self.total)
+        self.Q /= self.total
+        self.log_Q -= np.log(self.total)
+        if self.Q_history is not None:
+            self.Q_history.record(self.Q)
+
+    def reward(self, uav, target):
+        difference = target.target_position - uav.uav_position
+        in_view = target.is_target_in_view(target, uav)
+        rewards = np.zeros(len(in_view))
+        rewards[in_view] = 1 / np.linalg.norm(difference[in_view], axis=1)
+        return rewards
+
+    def update(self, uav, target, E_t):
+        self.update_batch(E_t, uav.uav_orientation, self.reward(uav, target))
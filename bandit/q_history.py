@@ -0,0 +1,58 @@
+import math
+
+import numpy as np
+
+
+class QHistory:
+    """Preallocated record of the Exp4-IX expert weights Q over rounds.
+
+    Keeps every `stride`-th round, or with summary=True the min / max / mean of each window of
+    `stride` rounds. With `path` the rows live in a .npy file opened as np.memmap, readable later
+    with np.load(path, mmap_mode='r'). batch_shape adds leading learner axes after the round axis.
+    """
+
+    def __init__(self, rounds, M, stride=1, summary=False, path=None, batch_shape=()):
+        self.stride = stride
+        self.summary = summary
+        num_rows = math.ceil(rounds / stride)
+        shape = (num_rows, 3) + tuple(batch_shape) + (M,) if summary else (num_rows,) + tuple(batch_shape) + (M,)
+        if path is None:
+            self.data = np.zeros(shape)
+        else:
+            self.data = np.lib.format.open_memmap(path, mode='w+', dtype=np.float64, shape=shape)
+        self.count = 0
+
+    def record(self, Q):
+        if self.count >= len(self.data) * self.stride:
+            raise IndexError(f"QHistory is full after {self.count} rounds")
+        row, offset = divmod(self.count, self.stride)
+        if offset == 0:
+            # In summary mode this starts min, max and mean of the window at Q
+            self.data[row] = Q
+        elif self.summary:
+            minimum, maximum, mean = self.data[row]
+            np.minimum(minimum, Q, out=minimum)
+            np.maximum(maximum, Q, out=maximum)
+            mean += (Q - mean) / (offset + 1)
+        self.count += 1
+
+    def __len__(self):
+        return math.ceil(self.count / self.stride)
+
+    def rounds(self):
+        # First round of each recorded row
+        return np.arange(len(self)) * self.stride
+
+    def values(self):
+        """Recorded Q rows, or the window means in summary mode (zero-copy view)."""
+        return self.data[:len(self), 2] if self.summary else self.data[:len(self)]
+
+    def minimum(self):
+        return self.data[:len(self), 0]
+
+    def maximum(self):
+        return self.data[:len(self), 1]
+
+    def flush(self):
+        if isinstance(self.data, np.memmap):
+            self.data.flush()
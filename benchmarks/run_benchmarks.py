@@ -0,0 +1,277 @@
+"""Micro and macro benchmarks of the simulation hot path.
+
+    python benchmarks/run_benchmarks.py --save benchmarks/results/baseline.json
+    python benchmarks/run_benchmarks.py --compare benchmarks/results/baseline.json
+
+Every benchmark reports the best, mean and std of several repeats in microseconds per call;
+--save writes them with the machine / library versions as JSON, --compare prints the ratio
+to a saved run and exits with 1 if any benchmark is slower than --threshold times the baseline.
+
+The startup benchmarks time a fresh interpreter importing a worker entry point, which every
+spawned worker process pays. --startup-target (seconds) also fails the run if one takes longer
+or loads any of HEAVY_MODULES.
+"""
+import argparse
+import json
+import os
+import platform
+import re
+import subprocess
+import sys
+import time
+import timeit
+
+import numpy as np
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from algorithm.batch_particle_filter import BatchParticleFilter  # noqa: E402
+from algorithm.particle_filter import ParticleFilter  # noqa: E402
+from algorithm.previous_position import previous_position  # noqa: E402
+from algorithm.trajectory_prediction import TrajectoryPredictor  # noqa: E402
+from bandit.bandit_algorithm import Exp4IX  # noqa: E402
+from bandit.q_history import QHistory  # noqa: E402
+from environment.Target_adversarial import Target_adversarial  # noqa: E402
+from environment.Target_tracking import Target_tracking, generate_smooth_trajectories, generate_smooth_trajectory  # noqa: E402
+from environment.UAV import UAV  # noqa: E402
+from environment.visibility import in_view  # noqa: E402
+
+MICRO = {}
+MACRO = {}
+STARTUP = ['simulation.monte_carlo', 'simulation.batch_simulation', 'main2']
+# Must not be imported by the simulation core; plotting and spline code load them on first use
+HEAVY_MODULES = ('scipy', 'matplotlib')
+
+
+def benchmark(registry, name):
+    # The decorated function does the setup and returns the zero-argument callable to time
+    def register(setup):
+        registry[name] = setup
+        return setup
+    return register
+
+
+def scene(seed=0):
+    rng = np.random.RandomState(seed)
+    uav = UAV(rng)
+    target = Target_tracking(uav.uav_position, rng)
+    # Put the target just ahead of the UAV, so the visible branch of every expert runs
+    uav.uav_orientation = 0
+    target.target_position = uav.uav_position + [100.0, 400.0]
+    uav.update(target)
+    return rng, uav, target
+
+
+@benchmark(MICRO, 'visibility.in_view')
+def bench_in_view():
+    _, uav, target = scene()
+    return lambda: in_view(target.target_position, uav.uav_position, uav.uav_orientation)
+
+
+@benchmark(MICRO, 'previous_position')
+def bench_previous_position():
+    _, uav, target = scene()
+    return lambda: previous_position(target, uav)
+
+
+@benchmark(MICRO, 'ParticleFilter.particle_filter[P=1000]')
+def bench_particle_filter():
+    rng, uav, target = scene()
+    pf = ParticleFilter(1000, uav.uav_position, target.target_position, rng=np.random.default_rng(0))
+    return lambda: pf.particle_filter(target, uav)
+
+
+@benchmark(MICRO, 'BatchParticleFilter.step[B=16,P=1000]')
+def bench_batch_particle_filter():
+    positions = np.random.default_rng(0).uniform(2000, 8000, (16, 2))
+    pf = BatchParticleFilter(1000, positions, [np.random.default_rng(i) for i in range(16)])
+    return lambda: pf.step(positions)
+
+
+@benchmark(MICRO, 'TrajectoryPredictor.trajectory_prediction')
+def bench_trajectory_prediction():
+    # One new visible observation per call, as in the frame loop
+    _, uav, target = scene()
+    tp = TrajectoryPredictor()
+
+    def step():
+        uav.view_target_trajectory.append(target.target_position)
+        return tp.trajectory_prediction(target, uav)
+    return step
+
+
+def exp4ix(n=10 ** 7):
+    # A two-row strided history, so millions of rounds fit without filling memory
+    return Exp4IX(n=n, k=4, M=3, delta=0.01, history=QHistory(n + 1, 3, stride=n))
+
+
+@benchmark(MICRO, 'Exp4IX.get_probs')
+def bench_exp4ix_get_probs():
+    bandit = exp4ix()
+    E_t = np.random.default_rng(0).dirichlet(np.ones(4), size=3)
+    return lambda: bandit.get_probs(E_t)
+
+
+@benchmark(MICRO, 'Exp4IX.get_probs+update')
+def bench_exp4ix_update():
+    _, uav, target = scene()
+    bandit = exp4ix()
+    E_t = np.random.default_rng(0).dirichlet(np.ones(4), size=3)
+
+    def step():
+        bandit.get_probs(E_t)
+        bandit.update(uav, target, E_t)
+    return step
+
+
+@benchmark(MICRO, 'generate_smooth_trajectory')
+def bench_generate_smooth_trajectory():
+    rng = np.random.RandomState(0)
+    return lambda: generate_smooth_trajectory([5000.0, 5000.0], rng=rng)
+
+
+@benchmark(MICRO, 'generate_smooth_trajectories[N=16]/16')
+def bench_generate_smooth_trajectories():
+    rng = np.random.default_rng(0)
+    positions = rng.uniform(2000, 8000, (16, 2))
+    return lambda: generate_smooth_trajectories(positions, rng=rng), 16
+
+
+@benchmark(MICRO, 'Target_adversarial.update')
+def bench_adversarial_update():
+    rng, uav, _ = scene()
+    target = Target_adversarial(uav.uav_position, rng)
+    return lambda: target.update(uav.uav_position)
+
+
+@benchmark(MICRO, 'UAV.move')
+def bench_uav_move():
+    _, uav, _ = scene()
+    probs = np.array([0.4, 0.3, 0.2, 0.1])
+    return lambda: uav.move(probs)
+
+
+def single_experiment(mode, frames):
+    import main2
+
+    def run():
+        np.random.seed(1)
+        main2.run_single_experiment(mode, frames=frames)
+    return run
+
+
+for mode_name, mode in (('smooth', 'Smooth Trajectory'), ('adversarial', 'Adversarial Trajectory')):
+    for frames in (250, 1000, 2000):
+        MACRO[f'run_single_experiment[{mode_name},frames={frames}]'] = (
+            lambda mode=mode, frames=frames: single_experiment(mode, frames))
+
+
+def measure(setup, repeat, autorange=True):
+    fn = setup()
+    calls_per_run = 1
+    if isinstance(fn, tuple):
+        fn, calls_per_run = fn
+    timer = timeit.Timer(fn)
+    # Micro benchmarks loop for at least 0.2 s per repeat, a macro run is timed once per repeat
+    number = timer.autorange()[0] if autorange else 1
+    times = np.array(timer.repeat(repeat=repeat, number=number)) / number / calls_per_run * 1e6
+    return {'best_us': float(times.min()), 'mean_us': float(times.mean()), 'std_us': float(times.std()),
+            'number': number, 'repeat': repeat}
+
+
+def measure_startup(module, repeat):
+    # Wall time of the whole child process, interpreter start included, as for a spawned worker
+    code = f"import sys; import {module}; print(' '.join(sorted({{m.split('.')[0] for m in sys.modules}})))"
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        loaded = subprocess.run([sys.executable, '-c', code], cwd=ROOT, capture_output=True, text=True,
+                                check=True).stdout.split()
+        times.append(time.perf_counter() - start)
+    times = np.array(times) * 1e6
+    return {'best_us': float(times.min()), 'mean_us': float(times.mean()), 'std_us': float(times.std()),
+            'number': 1, 'repeat': repeat, 'heavy_modules': [name for name in HEAVY_MODULES if name in loaded]}
+
+
+def metadata():
+    try:
+        commit = subprocess.run(['git', 'rev-parse', 'HEAD'], cwd=ROOT, capture_output=True, text=True).stdout.strip()
+    except OSError:
+        commit = None
+    import scipy
+    return {'time': time.strftime('%Y-%m-%dT%H:%M:%S'), 'commit': commit, 'python': platform.python_version(),
+            'numpy': np.__version__, 'scipy': scipy.__version__, 'machine': platform.machine(),
+            'processor': platform.processor(), 'cpu_count': os.cpu_count()}
+
+
+def compare(results, baseline, threshold):
+    regressions = []
+    print(f"\n{'benchmark':<52} {'baseline us':>12} {'current us':>12} {'ratio':>7}")
+    for name, result in results.items():
+        if name not in baseline:
+            print(f"{name:<52} {'-':>12} {result['best_us']:>12.1f}")
+            continue
+        ratio = result['best_us'] / baseline[name]['best_us']
+        flag = ' <-- slower' if ratio > threshold else ''
+        print(f"{name:<52} {baseline[name]['best_us']:>12.1f} {result['best_us']:>12.1f} {ratio:>7.2f}{flag}")
+        if ratio > threshold:
+            regressions.append(name)
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('-k', '--filter', default='', help='regular expression selecting benchmarks by name')
+    parser.add_argument('--micro-only', action='store_true')
+    parser.add_argument('--macro-only', action='store_true')
+    parser.add_argument('--startup-only', action='store_true')
+    parser.add_argument('--startup-target', type=float, default=None,
+                        help='fail if a worker entry point takes longer than this many seconds to import')
+    parser.add_argument('--repeat', type=int, default=5, help='repeats per micro benchmark (macro: 3)')
+    parser.add_argument('--save', help='write the results to this JSON file')
+    parser.add_argument('--compare', help='JSON file of an earlier --save to compare against')
+    parser.add_argument('--threshold', type=float, default=1.10, help='ratio above which a benchmark counts as slower')
+    args = parser.parse_args()
+
+    selected = []
+    if not (args.macro_only or args.startup_only):
+        selected += [(name, setup, args.repeat, True) for name, setup in MICRO.items()]
+    if not (args.micro_only or args.startup_only):
+        selected += [(name, setup, 3, False) for name, setup in MACRO.items()]
+    if not (args.micro_only or args.macro_only):
+        selected += [(f'startup: import {module}', module, 2 * args.repeat, None) for module in STARTUP]
+    selected = [item for item in selected if re.search(args.filter, item[0])]
+
+    results = {}
+    failed = False
+    for name, setup, repeat, autorange in selected:
+        if autorange is None:
+            results[name] = measure_startup(setup, repeat)
+        else:
+            results[name] = measure(setup, repeat, autorange)
+        print(f"{name:<52} {results[name]['best_us']:>12.1f} us  (mean {results[name]['mean_us']:.1f}"
+              f" +- {results[name]['std_us']:.1f}, {results[name]['number']} x {repeat})", flush=True)
+        if autorange is None and args.startup_target is not None:
+            if results[name]['heavy_modules'] or results[name]['best_us'] > args.startup_target * 1e6:
+                print(f"    over the startup target of {args.startup_target} s"
+                      f" (loads {results[name]['heavy_modules'] or 'no heavy modules'})")
+                failed = True
+
+    if args.save:
+        os.makedirs(os.path.dirname(os.path.abspath(args.save)), exist_ok=True)
+        with open(args.save, 'w') as f:
+            json.dump({'meta': metadata(), 'results': results}, f, indent=2)
+        print(f"Saved {len(results)} results to {args.save}")
+
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)['results']
+        if compare(results, baseline, args.threshold):
+            sys.exit(1)
+    if failed:
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
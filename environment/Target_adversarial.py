@@ -1,107 +1,147 @@
-import random
+import math
 
 import numpy as np
 
-from params import step_size
+from algorithm.sampling import UniformStream
+from environment.trajectory_store import TrajectoryStore
+from environment.visibility import in_view
+from params import frame_num, step_size
 
+# Direction codes follow the UAV action codes: up, down, left, right
+DIRECTION_MOVES = np.array([[0, step_size], [0, -step_size], [-step_size, 0], [step_size, 0]])
+UP, DOWN, LEFT, RIGHT = range(4)
+DIRECTION_STEPS = tuple(map(tuple, DIRECTION_MOVES.tolist()))
 
-def generate_first_control_point_near(uav_position):
-    point = np.random.uniform(
+
+def generate_first_control_point_near(uav_position, rng=np.random):
+    point = rng.uniform(
         low=np.array(uav_position) - [200, 200],
         high=np.array(uav_position) + [200, 200]
     )
     return np.clip(point, [2000, 2000], [8000, 8000])
 
 
+def lock_steps_from_uniform(u):
+    # Uniform integer in [10, 30]
+    return 10 + (21 * u).astype(int)
+
+
+def boundary_direction(x, y):
+    # Direction back inwards near the border of the map, None elsewhere
+    if x < 1000:
+        return RIGHT
+    elif x > 9000:
+        return LEFT
+    elif y < 1000:
+        return UP
+    elif y > 9000:
+        return DOWN
+    return None
+
+
+class AdversarialTargets:
+    """N adversarial targets stepped together; positions, directions and lock counters are arrays.
+
+    Each frame a target whose lock has run out moves for 10-30 frames either in the direction
+    taking it farthest from its UAV or in a random one (even odds); near the border of the map it
+    turns back inwards. `rng` is one generator for all targets or a list of per-target generators.
+    Every frame draws four uniforms per target whether they are used or not, so each target's
+    stream does not depend on the others and Target_adversarial, which steps one target the same
+    way on Python floats, reproduces its lane of a batch.
+    """
+
+    def __init__(self, first_positions, rng=np.random):
+        self.first_positions = np.array(first_positions, dtype=float)
+        self.batch_size = len(self.first_positions)
+        per_target = isinstance(rng, (list, tuple))
+        self.draws = 4 if per_target else 4 * self.batch_size
+        self.uniforms = UniformStream(rng, block_size=max(1024, self.draws))
+        self.reset()
+
+    def reset(self):
+        self.positions = self.first_positions.copy()
+        self.directions = np.full(self.batch_size, UP)
+        self.lock_steps = np.zeros(self.batch_size, dtype=int)
+
+    def farthest_directions(self, uav_positions):
+        # (N, 4) distances from each UAV after each possible move; ties go to the first direction
+        moved = self.positions[:, None, :] + DIRECTION_MOVES - uav_positions[:, None, :]
+        return np.argmax(np.linalg.norm(moved, axis=2), axis=1)
+
+    def update(self, uav_positions):
+        u = self.uniforms.draw_many(self.draws).reshape(self.batch_size, 4)
+
+        expired = self.lock_steps <= 0
+        self.lock_steps[~expired] -= 1
+        if expired.any():
+            chosen = np.where(u[:, 0] < 0.5, self.farthest_directions(uav_positions), (4 * u[:, 1]).astype(int))
+            self.directions[expired] = chosen[expired]
+            self.lock_steps[expired] = lock_steps_from_uniform(u[expired, 2])
+
+        x, y = self.positions[:, 0], self.positions[:, 1]
+        boundary = np.select([x < 1000, x > 9000, y < 1000, y > 9000], [RIGHT, LEFT, UP, DOWN], -1)
+        turned = boundary >= 0
+        if turned.any():
+            self.directions[turned] = boundary[turned]
+            self.lock_steps[turned] = lock_steps_from_uniform(u[turned, 3])
+
+        # A new array every frame, so positions handed out earlier are never changed
+        self.positions = np.clip(self.positions + DIRECTION_MOVES[self.directions], 0, 10000)
+        return self.positions
+
+    @classmethod
+    def from_targets(cls, targets):
+        """Batch of the given Target_adversarial objects, each keeping its own generator."""
+        return cls([target.target_first_position for target in targets], [target.rng for target in targets])
+
 
 class Target_adversarial:
-    def __init__(self, uav_position):
-        self.target_position = generate_first_control_point_near(uav_position)
-        self.target_first_position = self.target_position
-        self.target_positions = [self.target_position.copy()]
-        self.lock_steps = 0  # Number of times the direction is locked
-        self.adversarial_direction = 'up'
+    def __init__(self, uav_position, rng=np.random):
+        self.rng = rng
+        self.target_position = generate_first_control_point_near(uav_position, rng)
+        self.target_first_position = self.target_position.copy()
+        # Same stream as a lane of AdversarialTargets.from_targets: four uniforms every frame
+        self.uniforms = UniformStream(rng, block_size=1024)
+        self.target_positions = TrajectoryStore(frame_num + 1)
+        self.target_positions.append(self.target_position)
+        self.direction = UP
+        self.lock_steps = 0
+
+    def farthest_direction(self, x, y, uav_position):
+        # AdversarialTargets.farthest_directions on Python floats, with the same rounding and tie order
+        ux, uy = uav_position.tolist()
+        distances = []
+        for dx, dy in DIRECTION_STEPS:
+            mx, my = x + dx - ux, y + dy - uy
+            distances.append(math.sqrt(mx * mx + my * my))
+        return distances.index(max(distances))
 
     def update(self, uav_position):
-        def get_farthest_direction(uav_position):
-            """Calculate the direction for the target to move farthest away from the UAV."""
-            potential_moves = {
-                'up': np.array([0, step_size]),
-                'down': np.array([0, -step_size]),
-                'left': np.array([-step_size, 0]),
-                'right': np.array([step_size, 0])
-            }
-
-            farthest_direction = None
-            max_distance = -np.inf
-            for direction, move in potential_moves.items():
-                new_position = self.target_position + move
-                distance = np.linalg.norm(new_position - uav_position)
-                if distance > max_distance:
-                    max_distance = distance
-                    farthest_direction = direction
-
-            return farthest_direction
-
-        def check_boundary_and_adjust(target_position):
-            """Check the boundaries and adjust the direction if necessary."""
-            x, y = target_position
-            if x < 1000:
-                return 'right'
-            elif x > 9000:
-                return 'left'
-            elif y < 1000:
-                return 'up'
-            elif y > 9000:
-                return 'down'
-            else:
-                return None
-
+        # AdversarialTargets.update for one target, branching on Python floats
+        u0, u1, u2, u3 = self.uniforms.draw_many(4).tolist()
+        x, y = self.target_position.tolist()
         if self.lock_steps <= 0:
-            # Re-select the adversarial direction
-            if np.random.rand() < 0.5:
-                self.adversarial_direction = get_farthest_direction(uav_position)
-            else:
-                self.adversarial_direction = np.random.choice(['up', 'down', 'left', 'right'])
-            # Lock the adversarial direction for a number of steps
-            self.lock_steps = random.randint(10, 30)
+            self.direction = self.farthest_direction(x, y, uav_position) if u0 < 0.5 else int(4 * u1)
+            self.lock_steps = 10 + int(21 * u2)
         else:
             self.lock_steps -= 1
 
-        boundary_direction = check_boundary_and_adjust(self.target_position)
-        if boundary_direction:
-            self.adversarial_direction = boundary_direction
-            self.lock_steps = random.randint(10, 30)
-
-        # Move the target based on the locked adversarial direction
-        if self.adversarial_direction == 'up':
-            self.target_position[1] += step_size
-        elif self.adversarial_direction == 'down':
-            self.target_position[1] -= step_size
-        elif self.adversarial_direction == 'left':
-            self.target_position[0] -= step_size
-        elif self.adversarial_direction == 'right':
-            self.target_position[0] += step_size
-        self.target_position = np.clip(self.target_position, 0, 10000)
-        self.target_positions.append(self.target_position.copy())
+        boundary = boundary_direction(x, y)
+        if boundary is not None:
+            self.direction = boundary
+            self.lock_steps = 10 + int(21 * u3)
+
+        dx, dy = DIRECTION_STEPS[self.direction]
+        self.target_position = np.array([min(max(x + dx, 0.0), 10000.0), min(max(y + dy, 0.0), 10000.0)])
+        self.target_positions.append(self.target_position)
         return
 
     def reset(self):
-        self.target_position = self.target_first_position
-        self.target_positions = [self.target_position.copy()]
-        self.lock_steps = 0  # Number of times the direction is locked
-        self.adversarial_direction = 'up'
+        self.direction = UP
+        self.lock_steps = 0
+        self.target_position = self.target_first_position.copy()
+        self.target_positions.clear()
+        self.target_positions.append(self.target_position)
 
     def is_target_in_view(self, target, uav):
-        difference = target.target_position - uav.uav_position
-
-        if uav.uav_orientation == 0:  # Up
-            return (difference[1] > 0) and (abs(difference[0]) <= 800) and (difference[1] <= 1000)
-        elif uav.uav_orientation == 1:  # Right
-            return (difference[0] > 0) and (abs(difference[1]) <= 800) and (difference[0] <= 1000)
-        elif uav.uav_orientation == 2:  # Down
-            return (difference[1] < 0) and (abs(difference[0]) <= 800) and (abs(difference[1]) <= 1000)
-        elif uav.uav_orientation == 3:  # Left
-            return (difference[0] < 0) and (abs(difference[1]) <= 800) and (abs(difference[0]) <= 1000)
-        else:
-            return False
+        return in_view(target.target_position, uav.uav_position, uav.uav_orientation)
@@ -1,65 +1,89 @@
 import numpy as np
-from scipy.interpolate import splprep, splev
-from scipy.spatial.distance import euclidean
 
+from environment.visibility import in_view
 from params import max_dist, min_dist, frame_num
 
+RESAMPLING_MODES = ('refine', 'arc_length')
+
+
+def sample_control_points(uav_positions, uniforms):
+    """Control points of N trajectories from (N, 2 * num_control_points) uniforms in [0, 1).
+
+    Uniforms are used in the order of the original per-point draws (first point x, y, then
+    angle, radius for every further point), so one row reproduces the scalar random stream.
+    """
+    uav_positions = np.asarray(uav_positions, dtype=float)
+    num_control_points = uniforms.shape[1] // 2
+    low, high = uav_positions - [200, 200], uav_positions + [200, 200]
+    angles = 2 * np.pi * uniforms[:, 2::2]
+    radii = min_dist + (max_dist - min_dist) * uniforms[:, 3::2]
+    steps = np.stack((radii * np.cos(angles), radii * np.sin(angles)), axis=-1)
+
+    control_points = np.empty((len(uniforms), num_control_points, 2))
+    control_points[:, 0] = np.clip(low + (high - low) * uniforms[:, :2], [2000, 2000], [8000, 8000])
+    # Each step starts from the clipped previous point, so only this short loop stays sequential
+    for i in range(1, num_control_points):
+        control_points[:, i] = np.clip(control_points[:, i - 1] + steps[:, i - 1], [2000, 2000], [8000, 8000])
+    return control_points
+
+
+def spline_trajectory(control_points, num_points):
+    # scipy.interpolate takes longer to import than the rest of the simulation, so only load it
+    # once a trajectory is actually generated (adversarial runs and cache hits never need it)
+    from scipy.interpolate import splprep, splev
+
+    tck, u = splprep([control_points[:, 0], control_points[:, 1]], s=0)
+    u_new = np.linspace(u.min(), u.max(), num_points)
+    x_new, y_new = splev(u_new, tck, der=0)
+    return np.vstack((x_new, y_new)).T
+
+
+def refine_trajectory(trajectory, max_frame_distance):
+    # Splits every step longer than max_frame_distance into ceil(dist / max_frame_distance) equal parts
+    segments = np.diff(trajectory, axis=0)
+    dist = np.linalg.norm(segments, axis=1)
+    parts = np.where(dist > max_frame_distance, np.ceil(dist / max_frame_distance), 1).astype(int)
+
+    segment = np.repeat(np.arange(len(segments)), parts)
+    j = np.arange(len(segment)) - np.repeat(np.cumsum(parts) - parts, parts) + 1
+    refined = np.empty((len(segment) + 1, 2))
+    refined[0] = trajectory[0]
+    refined[1:] = trajectory[segment] + j[:, None] * segments[segment] / parts[segment, None]
+    # Segment end points are copied, not interpolated
+    refined[np.cumsum(parts)] = trajectory[1:]
+    return refined
+
+
+def arc_length_trajectory(trajectory, max_frame_distance):
+    # Equal arc-length spacing along the sampled spline, at least as many points as the input
+    lengths = np.concatenate(([0], np.cumsum(np.linalg.norm(np.diff(trajectory, axis=0), axis=1))))
+    num_points = max(len(trajectory), int(np.ceil(lengths[-1] / max_frame_distance)) + 1)
+    s = np.linspace(0, lengths[-1], num_points)
+    return np.stack((np.interp(s, lengths, trajectory[:, 0]), np.interp(s, lengths, trajectory[:, 1])), axis=1)
+
+
+def resample_trajectory(trajectory, max_frame_distance, resampling='refine'):
+    if resampling == 'refine':
+        return refine_trajectory(trajectory, max_frame_distance)
+    if resampling == 'arc_length':
+        return arc_length_trajectory(trajectory, max_frame_distance)
+    raise ValueError(f"Unknown resampling mode {resampling!r}, expected one of {RESAMPLING_MODES}")
+
 
 def generate_smooth_trajectory(uav_position, num_control_points=20, num_points=2000, max_frame_distance=24,
-                               max_attempts=100):
-    def generate_first_control_point_near(uav_position):
-        point = np.random.uniform(
-            low=np.array(uav_position) - [200, 200],
-            high=np.array(uav_position) + [200, 200]
-        )
-        return np.clip(point, [2000, 2000], [8000, 8000])
-
-    # 找中间点
-    def generate_random_point_near_last(last_point):
-        angle = np.random.uniform(0, 2 * np.pi)
-        radius = np.random.uniform(min_dist, max_dist)
-        x = last_point[0] + radius * np.cos(angle)
-        y = last_point[1] + radius * np.sin(angle)
-        point = np.array([x, y])
-        return np.clip(point, [2000, 2000], [8000, 8000])
+                               max_attempts=100, rng=np.random, resampling='refine'):
+    """Spline through random control points, no step longer than max_frame_distance.
 
+    resampling='refine' keeps the num_points spline samples and splits long steps, which gives
+    the same trajectory as the original point-by-point loop; 'arc_length' spaces the points
+    evenly along the curve instead.
+    """
     attempt = 0
     while attempt < max_attempts:
         try:
-            # Generate the first control point near the drone_position
-            control_points = [generate_first_control_point_near(uav_position)]
-
-            while len(control_points) < num_control_points:
-                new_point = generate_random_point_near_last(control_points[-1])
-                # Ensure that the new point is within the specified range and distance constraints
-                if (2000 <= new_point[0] <= 8000 and
-                        2000 <= new_point[1] <= 8000 and
-                        euclidean(new_point, control_points[-1]) <= max_dist):
-                    control_points.append(new_point)
-
-            control_points = np.array(control_points)
-
-            # Create a smooth trajectory using splines
-            tck, u = splprep([control_points[:, 0], control_points[:, 1]], s=0)
-
-            u_new = np.linspace(u.min(), u.max(), num_points)
-            x_new, y_new = splev(u_new, tck, der=0)
-            trajectory = np.vstack((x_new, y_new)).T
-
-            # Check distances between consecutive points
-            refined_trajectory = [trajectory[0]]
-            for i in range(1, len(trajectory)):
-                dist = euclidean(trajectory[i], trajectory[i - 1])
-                if dist > max_frame_distance:
-                    # If the distance is too large, add intermediate points
-                    num_extra_points = int(np.ceil(dist / max_frame_distance))
-                    for j in range(1, num_extra_points):
-                        intermediate_point = trajectory[i - 1] + j * (
-                                    trajectory[i] - trajectory[i - 1]) / num_extra_points
-                        refined_trajectory.append(intermediate_point)
-                refined_trajectory.append(trajectory[i])
-
-            return np.array(refined_trajectory)
+            control_points = sample_control_points([uav_position], rng.random((1, 2 * num_control_points)))[0]
+            trajectory = spline_trajectory(control_points, num_points)
+            return resample_trajectory(trajectory, max_frame_distance, resampling)
 
         except Exception as e:
             print(f"Error in trajectory generation: {e}")
@@ -69,11 +93,39 @@ def generate_smooth_trajectory(uav_position, num_control_points=20, num_points=2
     raise RuntimeError("Failed to generate a valid trajectory after several attempts.")
 
 
+def generate_smooth_trajectories(uav_positions, num_control_points=20, num_points=2000, max_frame_distance=24,
+                                 max_attempts=100, rng=np.random, resampling='refine'):
+    """N trajectories, one per UAV position; returns a list because their lengths differ.
+
+    With a list of rngs trajectory i is exactly generate_smooth_trajectory(uav_positions[i], rng=rng[i]).
+    With one rng all control points are drawn in a single call; a trajectory whose spline fails is
+    redrawn on its own.
+    """
+    if isinstance(rng, (list, tuple)):
+        return [generate_smooth_trajectory(position, num_control_points, num_points, max_frame_distance,
+                                           max_attempts, r, resampling) for position, r in zip(uav_positions, rng)]
+
+    control_points = sample_control_points(uav_positions, rng.random((len(uav_positions), 2 * num_control_points)))
+    trajectories = []
+    for position, points in zip(uav_positions, control_points):
+        try:
+            trajectory = resample_trajectory(spline_trajectory(points, num_points), max_frame_distance, resampling)
+        except Exception as e:
+            print(f"Error in trajectory generation: {e}")
+            trajectory = generate_smooth_trajectory(position, num_control_points, num_points, max_frame_distance,
+                                                    max_attempts, rng, resampling)
+        trajectories.append(trajectory)
+    return trajectories
 
 
 class Target_tracking:
-    def __init__(self, uav_position):
-        self.target_positions = generate_smooth_trajectory(uav_position, num_control_points=20, num_points=frame_num)
+    def __init__(self, uav_position, rng=np.random, cache=None):
+        # cache: an environment.trajectory_cache.TrajectoryCache, same trajectory and rng stream either way
+        if cache is None:
+            self.target_positions = generate_smooth_trajectory(uav_position, num_control_points=20,
+                                                               num_points=frame_num, rng=rng)
+        else:
+            self.target_positions = cache.trajectory(uav_position, rng, num_control_points=20, num_points=frame_num)
         self.target_position = self.target_positions[0]
         self.epoch = 0
 
@@ -83,18 +135,7 @@ class Target_tracking:
         return
 
     def is_target_in_view(self, target, uav):
-        difference = target.target_position - uav.uav_position
-
-        if uav.uav_orientation == 0:  # Up
-            return (difference[1] > 0) and (abs(difference[0]) <= 800) and (difference[1] <= 1000)
-        elif uav.uav_orientation == 1:  # Right
-            return (difference[0] > 0) and (abs(difference[1]) <= 800) and (difference[0] <= 1000)
-        elif uav.uav_orientation == 2:  # Down
-            return (difference[1] < 0) and (abs(difference[0]) <= 800) and (abs(difference[1]) <= 1000)
-        elif uav.uav_orientation == 3:  # Left
-            return (difference[0] < 0) and (abs(difference[1]) <= 800) and (abs(difference[0]) <= 1000)
-        else:
-            return False
+        return in_view(target.target_position, uav.uav_position, uav.uav_orientation)
 
     def reset(self):
         self.target_position = self.target_positions[0]
@@ -1,49 +1,50 @@
 import numpy as np
 
-from params import step_size
+from algorithm.sampling import ActionSampler
+from environment.trajectory_store import TrajectoryStore
+from params import frame_num, step_size
+
+# Integer action codes index the probability vectors: up, down, left, right
+ACTION_MOVES = np.array([[0, step_size], [0, -step_size], [-step_size, 0], [step_size, 0]])
+ACTION_ORIENTATIONS = np.array([0, 2, 3, 1])
 
 
 class UAV():
-    def __init__(self):
-        self.uav_position = np.random.uniform(2000, 8000, size=(2,))
-        self.first_uav_positions = self.uav_position
-        self.uav_orientation = np.random.choice([0, 1, 2, 3])
+    def __init__(self, rng=np.random):
+        self.action_sampler = ActionSampler(rng)
+        self.uav_position = rng.uniform(2000, 8000, size=(2,))
+        self.first_uav_positions = self.uav_position.copy()
+        self.uav_orientation = rng.choice([0, 1, 2, 3])
         self.first_uav_orientation = self.uav_orientation
-        self.uav_positions = [self.uav_position.copy()]
-        self.uav_orientations = [self.uav_orientation]
-        self.view_target_trajectory = []
+        # uav_positions also records the orientation of every frame
+        self.uav_positions = TrajectoryStore(frame_num + 1)
+        self.uav_positions.append(self.uav_position, self.uav_orientation)
+        self.view_target_trajectory = TrajectoryStore(frame_num)
+        self.target_in_view = False
 
     def update(self, target):
-        if target.is_target_in_view(target, self):
+        # Visibility of this frame for the experts; cleared by move, after which it is stale
+        self.target_in_view = target.is_target_in_view(target, self)
+        if self.target_in_view:
             self.view_target_trajectory.append(target.target_position)
         else:
             self.view_target_trajectory.append(None)
 
     def move(self, probs):
-        move = np.random.choice(['up', 'down', 'left', 'right'], p=probs)
-
-        if move == 'up':
-            self.uav_position[1] += step_size
-            self.uav_orientation = 0
-        elif move == 'down':
-            self.uav_position[1] -= step_size
-            self.uav_orientation = 2
-        elif move == 'left':
-            self.uav_position[0] -= step_size
-            self.uav_orientation = 3
-        elif move == 'right':
-            self.uav_position[0] += step_size
-            self.uav_orientation = 1
+        action = self.action_sampler.sample(probs)
+        self.uav_position += ACTION_MOVES[action]
+        self.uav_orientation = ACTION_ORIENTATIONS[action]
 
         # Ensure UAV position remains within the [0, 10000] range
         self.uav_position = np.clip(self.uav_position, 0, 10000)
+        self.target_in_view = None
 
-        self.uav_positions.append(self.uav_position.copy())
-        self.uav_orientations.append(self.uav_orientation)
+        self.uav_positions.append(self.uav_position, self.uav_orientation)
 
     def reset(self):
-        self.uav_position = self.first_uav_positions
+        self.uav_position = self.first_uav_positions.copy()
         self.uav_orientation = self.first_uav_orientation
-        self.uav_positions = [self.uav_position.copy()]
-        self.uav_orientations = [self.uav_orientation]
-        self.view_target_trajectory = []
\ No newline at end of file
+        self.target_in_view = False
+        self.uav_positions.clear()
+        self.uav_positions.append(self.uav_position, self.uav_orientation)
+        self.view_target_trajectory.clear()
@@ -0,0 +1,69 @@
+import numpy as np
+
+from algorithm.sampling import ActionSampler
+from environment.Target_adversarial import AdversarialTargets
+from environment.UAV import ACTION_MOVES, ACTION_ORIENTATIONS
+from environment.visibility import batch_in_view
+
+
+class BatchUAV:
+    """N UAVs in lockstep; same attribute names as UAV with a leading episode axis."""
+
+    def __init__(self, uavs, rngs):
+        self.batch_size = len(uavs)
+        self.action_sampler = ActionSampler(rngs)
+        self.first_uav_positions = np.array([uav.first_uav_positions for uav in uavs])
+        self.first_uav_orientations = np.array([uav.first_uav_orientation for uav in uavs])
+        self.reset()
+
+    def update(self, target):
+        # Visibility of this frame for the experts; cleared by move, after which it is stale
+        self.target_in_view = target.is_target_in_view(target, self)
+
+    def move(self, probs):
+        actions = self.action_sampler.sample(probs)
+        self.uav_position += ACTION_MOVES[actions]
+        self.uav_orientation = ACTION_ORIENTATIONS[actions]
+        self.uav_position = np.clip(self.uav_position, 0, 10000)
+        self.target_in_view = None
+
+    def reset(self):
+        self.uav_position = self.first_uav_positions.copy()
+        self.uav_orientation = self.first_uav_orientations.copy()
+        self.target_in_view = np.zeros(self.batch_size, dtype=bool)
+
+
+class BatchTarget:
+    """N targets in lockstep behind the scalar target interface.
+
+    Smooth trajectories are stacked into one (N, frames, 2) array; adversarial targets are
+    stepped together by one AdversarialTargets model using each target's own generator.
+    """
+
+    def __init__(self, targets, epoch=None):
+        self.targets = targets
+        self.trajectories = None
+        self.adversarial = None
+        if epoch is not None:
+            self.trajectories = np.stack([target.target_positions[:epoch] for target in targets])
+        else:
+            self.adversarial = AdversarialTargets.from_targets(targets)
+        self.reset()
+
+    def update(self, uav_position):
+        if self.trajectories is not None:
+            self.target_position = self.trajectories[:, self.epoch]
+        else:
+            self.target_position = self.adversarial.update(uav_position)
+        self.epoch += 1
+
+    def reset(self):
+        for target in self.targets:
+            target.reset()
+        if self.adversarial is not None:
+            self.adversarial.reset()
+        self.target_position = np.array([target.target_position for target in self.targets])
+        self.epoch = 0
+
+    def is_target_in_view(self, target, uav):
+        return batch_in_view(target.target_position, uav.uav_position, uav.uav_orientation)
@@ -0,0 +1,124 @@
+import hashlib
+import os
+import tempfile
+
+import numpy as np
+
+from environment.Target_tracking import generate_smooth_trajectory
+from params import max_dist, min_dist
+
+CACHE_VERSION = 1
+
+
+def rng_state(rng):
+    # Legacy RandomState / np.random expose get_state(), Generator its bit_generator state
+    if hasattr(rng, 'get_state'):
+        return rng.get_state()
+    return rng.bit_generator.state
+
+
+def state_bytes(state):
+    if isinstance(state, dict):
+        return b''.join(str(key).encode() + state_bytes(state[key]) for key in sorted(state))
+    if isinstance(state, (tuple, list)):
+        return b''.join(state_bytes(item) for item in state)
+    if isinstance(state, np.ndarray):
+        return state.tobytes()
+    return repr(state).encode()
+
+
+class CountingRng:
+    """Forwards rng.random and counts the uniforms drawn, so a cache hit can skip as many."""
+
+    def __init__(self, rng):
+        self.rng = rng
+        self.draws = 0
+
+    def random(self, size):
+        self.draws += int(np.prod(size))
+        return self.rng.random(size)
+
+
+class TrajectoryCache:
+    """Content-addressed on-disk cache of generate_smooth_trajectory output.
+
+    The key hashes the rng state at generation time (which is fixed by the seed and everything drawn
+    before it, e.g. the UAV start), the UAV start itself and every generation parameter. Entries are
+    .npy files loaded with mmap_mode='r'. On a hit the rng is advanced past the uniforms the
+    generator drew, so later draws are the same as without the cache. The directory is kept under
+    max_bytes by deleting the least recently used files (by mtime, refreshed on each hit).
+    """
+
+    def __init__(self, directory, max_bytes=256 * 2 ** 20):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        os.makedirs(directory, exist_ok=True)
+        self.files = {}
+        for name in os.listdir(directory):
+            key, _, rest = name.partition('_')
+            if rest.endswith('.npy'):
+                self.files[key] = name
+        self.written = self.size()
+
+    def key(self, uav_position, rng, num_control_points, num_points, max_frame_distance, resampling):
+        params = (CACHE_VERSION, num_control_points, num_points, min_dist, max_dist, max_frame_distance, resampling)
+        digest = hashlib.sha1(repr(params).encode())
+        digest.update(np.asarray(uav_position, dtype=np.float64).tobytes())
+        digest.update(state_bytes(rng_state(rng)))
+        return digest.hexdigest()
+
+    def trajectory(self, uav_position, rng=np.random, num_control_points=20, num_points=2000, max_frame_distance=24,
+                   resampling='refine'):
+        key = self.key(uav_position, rng, num_control_points, num_points, max_frame_distance, resampling)
+        name = self.files.get(key)
+        if name is not None:
+            path = os.path.join(self.directory, name)
+            try:
+                trajectory = np.load(path, mmap_mode='r')
+                os.utime(path)
+            except (OSError, ValueError):
+                # Evicted or half-written by another process
+                del self.files[key]
+            else:
+                draws = int(name[len(key) + 1:-len('.npy')])
+                rng.random(draws)
+                return trajectory
+
+        counting_rng = CountingRng(rng)
+        trajectory = generate_smooth_trajectory(uav_position, num_control_points, num_points, max_frame_distance,
+                                                rng=counting_rng, resampling=resampling)
+        self.store(key, counting_rng.draws, trajectory)
+        return trajectory
+
+    def store(self, key, draws, trajectory):
+        name = f'{key}_{draws}.npy'
+        # Write then rename, so parallel workers never read a partial file
+        fd, tmp_path = tempfile.mkstemp(dir=self.directory, suffix='.tmp')
+        with os.fdopen(fd, 'wb') as f:
+            np.save(f, trajectory)
+        os.replace(tmp_path, os.path.join(self.directory, name))
+        self.files[key] = name
+        self.written += os.path.getsize(os.path.join(self.directory, name))
+        # Rescan only when the running estimate (which ignores other writers' evictions) is over budget
+        if self.written > self.max_bytes:
+            self.evict(keep=name)
+            self.written = self.size()
+
+    def size(self):
+        return sum(entry.stat().st_size for entry in os.scandir(self.directory) if entry.name.endswith('.npy'))
+
+    def evict(self, keep=None):
+        entries = [(entry.stat().st_mtime_ns, entry.stat().st_size, entry.name)
+                   for entry in os.scandir(self.directory) if entry.name.endswith('.npy') and entry.name != keep]
+        total = sum(size for _, size, _ in entries)
+        if keep is not None:
+            total += os.path.getsize(os.path.join(self.directory, keep))
+        for _, size, name in sorted(entries):
+            if total <= self.max_bytes:
+                break
+            try:
+                os.remove(os.path.join(self.directory, name))
+            except FileNotFoundError:
+                pass
+            self.files.pop(name.partition('_')[0], None)
+            total -= size
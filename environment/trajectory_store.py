@@ -0,0 +1,60 @@
+import numpy as np
+
+
+class TrajectoryStore:
+    """Preallocated per-frame record of positions, orientations and a visibility mask.
+
+    Appending writes in place, so no per-frame arrays are allocated. Readers get views in
+    chronological order, zero-copy until more than `capacity` frames have been appended; after
+    that the buffer wraps around and keeps only the latest `capacity` frames.
+    """
+
+    def __init__(self, capacity):
+        self.capacity = capacity
+        self.position_buffer = np.full((capacity, 2), np.nan)
+        self.orientation_buffer = np.zeros(capacity, dtype=np.int8)
+        self.visible_buffer = np.zeros(capacity, dtype=bool)
+        self.count = 0
+
+    def append(self, position, orientation=0, visible=True):
+        i = self.count % self.capacity
+        if position is None:
+            self.position_buffer[i] = np.nan
+            visible = False
+        else:
+            self.position_buffer[i] = position
+        self.orientation_buffer[i] = orientation
+        self.visible_buffer[i] = visible
+        self.count += 1
+
+    def clear(self):
+        self.count = 0
+
+    def entry(self, frame_index):
+        # frame_index counts every append since the last clear; it must be within the latest capacity frames
+        i = frame_index % self.capacity
+        return self.position_buffer[i], self.visible_buffer[i]
+
+    def __len__(self):
+        return min(self.count, self.capacity)
+
+    def _chronological(self, buffer):
+        if self.count <= self.capacity:
+            return buffer[:self.count]
+        return np.roll(buffer, -(self.count % self.capacity), axis=0)
+
+    def positions(self):
+        return self._chronological(self.position_buffer)
+
+    def orientations(self):
+        return self._chronological(self.orientation_buffer)
+
+    def visible(self):
+        return self._chronological(self.visible_buffer)
+
+    def __array__(self, dtype=None, copy=None):
+        # Lets plotting code treat a store like the (frames, 2) position array it used to build
+        positions = self.positions()
+        if dtype is not None:
+            positions = positions.astype(dtype, copy=False)
+        return positions.copy() if copy else positions
@@ -0,0 +1,47 @@
+import numpy as np
+
+# Per orientation code (0 up, 1 right, 2 down, 3 left): the coordinate and sign of the viewing
+# direction, the lateral coordinate, and how far ahead / to either side the UAV can see
+FORWARD_AXIS = (1, 0, 1, 0)
+FORWARD_SIGN = (1.0, 1.0, -1.0, -1.0)
+LATERAL_AXIS = (0, 1, 0, 1)
+VIEW_RANGE = (1000.0, 1000.0, 1000.0, 1000.0)
+VIEW_HALF_WIDTH = (800.0, 800.0, 800.0, 800.0)
+
+FORWARD_AXIS_TABLE = np.array(FORWARD_AXIS)
+FORWARD_SIGN_TABLE = np.array(FORWARD_SIGN)
+LATERAL_AXIS_TABLE = np.array(LATERAL_AXIS)
+VIEW_RANGE_TABLE = np.array(VIEW_RANGE)
+VIEW_HALF_WIDTH_TABLE = np.array(VIEW_HALF_WIDTH)
+
+
+def in_view(target_position, uav_position, uav_orientation):
+    """Whether the target lies in the UAV's view rectangle: ahead by (0, 1000], sideways by at most 800.
+
+    A plain comparison chain, cheaper per call than indexing the tables; orientations other than 0-3 see nothing.
+    """
+    difference = target_position - uav_position
+
+    if uav_orientation == 0:  # Up
+        return (difference[1] > 0) and (abs(difference[0]) <= 800) and (difference[1] <= 1000)
+    elif uav_orientation == 1:  # Right
+        return (difference[0] > 0) and (abs(difference[1]) <= 800) and (difference[0] <= 1000)
+    elif uav_orientation == 2:  # Down
+        return (difference[1] < 0) and (abs(difference[0]) <= 800) and (abs(difference[1]) <= 1000)
+    elif uav_orientation == 3:  # Left
+        return (difference[0] < 0) and (abs(difference[1]) <= 800) and (abs(difference[0]) <= 1000)
+    else:
+        return False
+
+
+def batch_in_view(target_positions, uav_positions, uav_orientations):
+    """in_view for (N, 2) positions and (N,) orientations, returns an (N,) bool array."""
+    difference = target_positions - uav_positions
+    rows = np.arange(len(difference))
+    valid = (uav_orientations >= 0) & (uav_orientations < len(FORWARD_AXIS))
+    uav_orientations = np.where(valid, uav_orientations, 0)
+    forward = FORWARD_SIGN_TABLE[uav_orientations] * difference[rows, FORWARD_AXIS_TABLE[uav_orientations]]
+    lateral = difference[rows, LATERAL_AXIS_TABLE[uav_orientations]]
+    return (valid & (forward > 0) & (forward <= VIEW_RANGE_TABLE[uav_orientations])
+            & (np.abs(lateral) <= VIEW_HALF_WIDTH_TABLE[uav_orientations]))
+
@@ -1,31 +1,30 @@
+import argparse
+import shutil
+from functools import partial
+
 import numpy as np
+from matplotlib import rcParams
 
-from algorithm.average_fusion import average_fusion
-from algorithm.particle_filter import ParticleFilter
-from algorithm.previous_position import previous_position
-from algorithm.trajectory_prediction import trajectory_prediction
-from bandit.bandit_algorithm import Exp4IX
+from algorithm.expert_advice import EXPERTS, build_experts
 from environment.Target_adversarial import Target_adversarial
 from environment.Target_tracking import Target_tracking
 from environment.UAV import UAV
-from params import frame_num
-from plot.animation import animation_video
-from plot.combine_images import combine_images
+from params import num_particles
+from plot.animation import STYLE, final_frame_array, render_videos
+from plot.combine_images import TITLES, combine_images
 from plot.plot_cumulative_distances import plot_cumulative_distances
 from plot.plot_q_weights import plot_q_weights
+from simulation.kernel import episode_length, run_episode
+from simulation.policies import ALGORITHMS, make_policy
+from simulation.profiling import NULL_TIMER
 
+# Set font to an English font (e.g., Arial) for every figure of this script
+rcParams.update(STYLE)
 
 np.random.seed(0)
 
-def run_all_simulations(mode='Smooth Trajectory', generate_animation='on'):
-    algorithms = [
-        'Previous Position Algorithm',
-        'Particle Filtering Algorithm',
-        'Trajectory Fitting Algorithm',
-        'Average Fusion Algorithm',
-        'Exp4-IX Algorithm'
-    ]
-    cumulative_distances = {algo: [] for algo in algorithms}
+def run_all_simulations(mode='Smooth Trajectory', generate_animation='on', algorithms=ALGORITHMS, timer=NULL_TIMER):
+    cumulative_distances = {}
 
     uav = UAV()
     if mode == 'Smooth Trajectory':
@@ -34,72 +33,45 @@ def run_all_simulations(mode='Smooth Trajectory', generate_animation='on'):
     else:
         target = Target_adversarial(uav.uav_position)
         print("Initialized adversarial target.")
+    epoch = episode_length(target)
+    make_experts = partial(build_experts, num_particles=num_particles)
+    trajectories = {}
+    final_frames = {}
 
     for algorithm in algorithms:
         print(f"Starting simulation in \"{mode}\" mode using \"{algorithm}\" ...")
 
-        pf = ParticleFilter(num_particles=1000, uav_position=uav.uav_position, uav_orientation=target.target_position)
-        epoch = min(frame_num, len(target.target_positions)) if mode == 'tracking' else frame_num
-        exp4ix = Exp4IX(n=epoch, k=4, M=3, delta=0.01)
-
-        cumulative_distance = 0
-        distances_over_time = []
-
-        for i in range(epoch):
-            target.update(uav.uav_position)
-            uav.update(target)
-            if algorithm == 'Previous Position Algorithm':
-                probs = previous_position(target, uav)
-            elif algorithm == 'Particle Filtering Algorithm':
-                probs = pf.particle_filter(target, uav)
-            elif algorithm == 'Trajectory Fitting Algorithm':
-                probs = trajectory_prediction(target, uav)
-            elif algorithm == 'Average Fusion Algorithm':
-                probs_previous = previous_position(target, uav)
-                probs_particle_filter = pf.particle_filter(target, uav)
-                probs_trajectory = trajectory_prediction(target, uav)
-                expert_advice = np.vstack((probs_previous, probs_particle_filter, probs_trajectory))
-                probs = average_fusion(expert_advice)
-            elif algorithm == 'Exp4-IX Algorithm':
-                probs_previous = previous_position(target, uav)
-                probs_particle_filter = pf.particle_filter(target, uav)
-                probs_trajectory = trajectory_prediction(target, uav)
-                expert_advice = np.vstack((probs_previous, probs_particle_filter, probs_trajectory))
-                probs = exp4ix.get_probs(expert_advice)
-
-            uav.move(probs)
-
-            if algorithm == 'Exp4-IX Algorithm':
-                exp4ix.update(uav, target, expert_advice)
-
-            # Calculate distance and accumulate
-            distance = np.linalg.norm(target.target_position - uav.uav_position)
-            cumulative_distance += distance / 100
-            distances_over_time.append(cumulative_distance)
-
-        cumulative_distances[algorithm] = distances_over_time
+        policy = make_policy(algorithm)
+        cumulative_distances[algorithm] = run_episode(policy, uav, target, make_experts, epoch,
+                                                      timer=timer.section(algorithm))
 
-        if generate_animation == 'on':
-            print("Simulation complete. Generating animation...")
-            animation_video(target, uav, mode, algorithm)
-            print("Animation video generated.")
+        # The next episode resets uav and target, so keep a copy of the recorded paths
+        trajectories[algorithm] = np.array(uav.uav_positions), np.array(target.target_positions)
 
         if algorithm == 'Exp4-IX Algorithm':
-            plot_q_weights(exp4ix.Q_history, algorithms[:3])
+            plot_q_weights(policy.exp4ix.Q_history, EXPERTS)
 
-        uav.reset()
-        target.reset()
+    if generate_animation == 'on' and shutil.which('ffmpeg') is None:
+        print("ffmpeg not found; skipping the animation videos (final frames are drawn from the recorded paths)")
+    elif generate_animation == 'on':
+        print("Simulations complete. Generating animations...")
+        rendered = render_videos([(*trajectories[algorithm], mode, algorithm) for algorithm in algorithms])
+        final_frames = {algorithm: image for algorithm, (_, image) in zip(algorithms, rendered)}
+        print("Animation videos generated.")
 
     # Plot cumulative distances
     plot_cumulative_distances(cumulative_distances)
+    # Recorded paths of every algorithm and, with animations, the final-frame images already saved
+    return trajectories, final_frames
 
 # Run all simulations
-# 'Smooth Trajectory', 'Adversarial Trajectory'
-run_all_simulations(mode='Smooth Trajectory', generate_animation='on')
-image_files = [
-    'experimental_pic/final_frame_Smooth Trajectory_Previous Position Algorithm_setting.jpg',
-    'experimental_pic/final_frame_Smooth Trajectory_Particle Filtering Algorithm_setting.jpg',
-    'experimental_pic/final_frame_Smooth Trajectory_Average Fusion Algorithm_setting.jpg',
-    'experimental_pic/final_frame_Smooth Trajectory_Exp4-IX Algorithm_setting.jpg',
-]
-combine_images(image_files)
\ No newline at end of file
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Run every algorithm on one target and render the report.')
+    parser.add_argument('--mode', default='Smooth Trajectory', choices=['Smooth Trajectory', 'Adversarial Trajectory'])
+    # Without videos (or without ffmpeg) nothing is encoded and the combined figure is drawn straight
+    # from the recorded paths; with videos it reuses the final frames they saved
+    parser.add_argument('--no-animation', action='store_true', help='skip the MP4 videos (ffmpeg is not needed)')
+    args = parser.parse_args()
+    trajectories, final_frames = run_all_simulations(mode=args.mode,
+                                                     generate_animation='off' if args.no_animation else 'on')
+    combine_images([final_frames.get(algorithm) or final_frame_array(*trajectories[algorithm]) for algorithm in TITLES])
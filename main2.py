@@ -1,89 +1,42 @@
+from functools import partial
+
 import numpy as np
-import matplotlib.pyplot as plt
 
-from algorithm.average_fusion import average_fusion
-from algorithm.particle_filter import ParticleFilter
-from algorithm.previous_position import previous_position
-from algorithm.trajectory_prediction import trajectory_prediction
-from bandit.bandit_algorithm import Exp4IX
+from algorithm.expert_advice import build_experts
 from environment.Target_adversarial import Target_adversarial
 from environment.Target_tracking import Target_tracking
 from environment.UAV import UAV
-from params import frame_num
+from params import num_particles
+from simulation.kernel import episode_length, run_episode
+from simulation.monte_carlo import run_paired_monte_carlo, run_parallel_monte_carlo
+from simulation.policies import ALGORITHMS, make_policy
+from simulation.profiling import NULL_TIMER
 
 np.random.seed(1)
 
-def run_single_experiment(mode='Smooth Trajectory'):
-    algorithms = [
-        'Previous Position Algorithm',
-        'Particle Filtering Algorithm',
-        'Trajectory Fitting Algorithm',
-        'Average Fusion Algorithm',
-        'Exp4-IX Algorithm'
-    ]
-    cumulative_distances = {algo: [] for algo in algorithms}
+def run_single_experiment(mode='Smooth Trajectory', algorithms=ALGORITHMS, timer=NULL_TIMER, frames=None):
+    cumulative_distances = {}
 
     uav = UAV()
     if mode == 'Smooth Trajectory':
         target = Target_tracking(uav.uav_position)
     else:
         target = Target_adversarial(uav.uav_position)
+    epoch = episode_length(target) if frames is None else min(frames, episode_length(target))
+    make_experts = partial(build_experts, num_particles=num_particles)
 
     for algorithm in algorithms:
-        pf = ParticleFilter(num_particles=1000, uav_position=uav.uav_position, uav_orientation=target.target_position)
-        epoch = min(frame_num, len(target.target_positions)) if mode == 'Smooth Trajectory' else frame_num
-        exp4ix = Exp4IX(n=epoch, k=4, M=3, delta=0.01)
-        uav.reset()
-        target.reset()
-
-        cumulative_distance = 0
-
-        for i in range(epoch):
-            target.update(uav.uav_position)
-            uav.update(target)
-
-            if algorithm == 'Previous Position Algorithm':
-                probs = previous_position(target, uav)
-            elif algorithm == 'Particle Filtering Algorithm':
-                probs = pf.particle_filter(target, uav)
-            elif algorithm == 'Trajectory Fitting Algorithm':
-                probs = trajectory_prediction(target, uav)
-            elif algorithm == 'Average Fusion Algorithm':
-                probs_previous = previous_position(target, uav)
-                probs_particle_filter = pf.particle_filter(target, uav)
-                probs_trajectory = trajectory_prediction(target, uav)
-                expert_advice = np.vstack((probs_previous, probs_particle_filter, probs_trajectory))
-                probs = average_fusion(expert_advice)
-            elif algorithm == 'Exp4-IX Algorithm':
-                probs_previous = previous_position(target, uav)
-                probs_particle_filter = pf.particle_filter(target, uav)
-                probs_trajectory = trajectory_prediction(target, uav)
-                expert_advice = np.vstack((probs_previous, probs_particle_filter, probs_trajectory))
-                probs = exp4ix.get_probs(expert_advice)
-
-            uav.move(probs)
-            distance = np.linalg.norm(uav.uav_position - target.target_position)
-            cumulative_distance += distance / 100
-            cumulative_distances[algorithm].append(cumulative_distance)
-
-            if algorithm == 'Exp4-IX Algorithm':
-                exp4ix.update(uav, target, expert_advice)
+        cumulative_distances[algorithm] = run_episode(make_policy(algorithm), uav, target, make_experts, epoch,
+                                                      timer=timer.section(algorithm))
 
     return cumulative_distances
 
-def run_monte_carlo_experiments(mode='tracking', num_experiments=50):
-    algorithms = [
-        'Previous Position Algorithm',
-        'Particle Filtering Algorithm',
-        'Trajectory Fitting Algorithm',
-        'Average Fusion Algorithm',
-        'Exp4-IX Algorithm'
-    ]
+def run_monte_carlo_experiments(mode='tracking', num_experiments=50, algorithms=ALGORITHMS):
     all_distances = {algo: [] for algo in algorithms}
 
     for epoch in range(num_experiments):
         print(epoch + 1, "/", num_experiments)
-        cumulative_distances = run_single_experiment(mode)
+        cumulative_distances = run_single_experiment(mode, algorithms)
         for algo in algorithms:
             all_distances[algo].append(cumulative_distances[algo])
 
@@ -94,6 +47,9 @@ def run_monte_carlo_experiments(mode='tracking', num_experiments=50):
     return avg_distances, std_distances
 
 def plot_avg_cumulative_distances(avg_distances, std_distances, output_file='experimental_pic/avg_cumulative_distances.jpg'):
+    # Imported here, so worker processes importing this module do not load matplotlib
+    import matplotlib.pyplot as plt
+
     plt.figure(figsize=(14, 10))
     colors = ['#1f77b4', '#ff7f0e', '#2ca02c', '#d62728', '#9467bd']
 
@@ -121,6 +77,19 @@ def plot_avg_cumulative_distances(avg_distances, std_distances, output_file='exp
     plt.show()
 
 # Run the Monte Carlo simulations and plot results
-simulation_mode = 'Adversarial Trajectory'
-avg_distances, std_distances = run_monte_carlo_experiments(mode=simulation_mode, num_experiments=100)
-plot_avg_cumulative_distances(avg_distances, std_distances)
\ No newline at end of file
+if __name__ == '__main__':
+    simulation_mode = 'Adversarial Trajectory'
+    # True: all algorithms share the target / action / particle filter random numbers of each
+    # experiment, and the differences to Exp4-IX are reported with paired confidence intervals
+    paired = False
+    # Finished batches are kept in results_dir; rerunning resumes after them, and
+    # simulation.monte_carlo.load_monte_carlo_results(results_dir) replots without simulating
+    if paired:
+        avg_distances, std_distances, comparison = run_paired_monte_carlo(
+            mode=simulation_mode, num_experiments=100, root_seed=1,
+            results_dir=f'experimental_results/{simulation_mode} paired')
+        comparison.report('Exp4-IX Algorithm')
+    else:
+        avg_distances, std_distances = run_parallel_monte_carlo(mode=simulation_mode, num_experiments=100, root_seed=1,
+                                                                results_dir=f'experimental_results/{simulation_mode}')
+    plot_avg_cumulative_distances(avg_distances, std_distances)
\ No newline at end of file
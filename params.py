@@ -7,5 +7,11 @@ step_size = 28.0
 # 调整帧数
 frame_num = 2000
 
+# 粒子滤波的粒子数
+num_particles = 1000
+
+# Exp4-IX 的置信参数 delta
+delta = 0.01
+
 #
 animation_dpi = 150
@@ -1,65 +1,153 @@
+import os
+import shutil
+import subprocess
+from concurrent.futures import ProcessPoolExecutor
+
 import numpy as np
-from matplotlib import pyplot as plt, animation, rcParams
-import matplotlib.patches as patches
+from matplotlib import rc_context, rcParams
+from matplotlib.backends.backend_agg import FigureCanvasAgg
+from matplotlib.figure import Figure
 
 from params import animation_dpi
 
-# Set font to an English font (e.g., Arial)
-rcParams['font.family'] = 'Arial'
+# Set font to an English font (e.g., Arial); applied per call, so importing this module changes no global state
+STYLE = {'font.family': 'Arial'}
+
+
+def dash_offsets(line, points):
+    """Dash offset of every vertex of `line`, so separately drawn segments continue one dash pattern."""
+    pixels = line.axes.transData.transform(points)
+    length = np.concatenate(([0.0], np.cumsum(np.hypot(*np.diff(pixels, axis=0).T))))
+    length *= 72 / line.figure.dpi
+    if rcParams['lines.scale_dashes']:
+        length /= line.get_linewidth()
+    return length
+
+
+def open_ffmpeg(path, width, height, fps, ffmpeg='ffmpeg'):
+    if shutil.which(ffmpeg) is None:
+        raise RuntimeError(f"{ffmpeg!r} not found; install ffmpeg to render videos")
+    command = [ffmpeg, '-y', '-loglevel', 'error', '-f', 'rawvideo', '-pix_fmt', 'rgba', '-s', f'{width}x{height}',
+               '-r', str(fps), '-i', '-', '-vcodec', 'h264', '-pix_fmt', 'yuv420p', path]
+    return subprocess.Popen(command, stdin=subprocess.PIPE)
 
-def animation_video(target, uav, mode, algorithm, dpi=animation_dpi):
-    uav_positions = np.array(uav.uav_positions) / 100  # Convert to km
-    target_positions = np.array(target.target_positions) / 100  # Convert to km
+
+@rc_context(STYLE)
+def render_video(uav_positions, target_positions, mode, algorithm, dpi=animation_dpi, fps=20, ffmpeg='ffmpeg'):
+    """Render the tracking video and final-frame image from recorded (frames, 2) positions in metres.
+
+    Frames are drawn incrementally: the axes background, holding the paths so far, is kept
+    between frames, so each frame draws one new segment per path plus the two dots and is piped
+    to ffmpeg as raw RGBA. Uses the Agg canvas directly, so no display is needed.
+    """
+    recorded = uav_positions, target_positions
+    uav_positions = np.asarray(uav_positions) / 100  # Convert to km
+    target_positions = np.asarray(target_positions) / 100  # Convert to km
 
     # Calculate the minimum number of frames
     num_frames = min(len(target_positions), len(uav_positions))
 
-    fig, ax = plt.subplots(figsize=(10, 8), dpi=dpi)  # Use dpi parameter for resolution
+    fig = Figure(figsize=(10, 8), dpi=dpi)  # Use dpi parameter for resolution
+    canvas = FigureCanvasAgg(fig)
+    ax = fig.add_subplot()
     ax.set_xlim(0, 100)  # Adjusted for km
     ax.set_ylim(0, 100)  # Adjusted for km
     target_line, = ax.plot([], [], 'r-', label='Target Trajectory')
     uav_line, = ax.plot([], [], 'b--', label='UAV Trajectory')
     uav_dot, = ax.plot([], [], 'bo', label='UAV Position')
     target_dot, = ax.plot([], [], 'ro', label='Target Position')
+    ax.legend(fontsize=14)
+    for artist in (target_line, uav_line, uav_dot, target_dot):
+        artist.set_animated(True)
+
+    canvas.draw()
+    background = canvas.copy_from_bbox(ax.bbox)
+    uav_offsets = dash_offsets(uav_line, uav_positions[:num_frames])
+    dashed_pattern = rcParams['lines.dashed_pattern']
+
+    video_file = f'experimental_video/UAV_tracking_{mode}_{algorithm}_setting.mp4'
+    width, height = canvas.get_width_height()
+    writer = open_ffmpeg(video_file, width, height, fps, ffmpeg)
+    try:
+        for frame in range(num_frames):
+            canvas.restore_region(background)
+            # As before, frame f shows the paths up to point f - 1 and the dots at point f
+            if frame >= 2:
+                target_line.set_data(target_positions[frame - 2:frame, 0], target_positions[frame - 2:frame, 1])
+                uav_line.set_data(uav_positions[frame - 2:frame, 0], uav_positions[frame - 2:frame, 1])
+                uav_line.set_linestyle((uav_offsets[frame - 2], dashed_pattern))
+                ax.draw_artist(target_line)
+                ax.draw_artist(uav_line)
+                background = canvas.copy_from_bbox(ax.bbox)
+            uav_dot.set_data(uav_positions[frame:frame + 1, 0], uav_positions[frame:frame + 1, 1])
+            target_dot.set_data(target_positions[frame:frame + 1, 0], target_positions[frame:frame + 1, 1])
+            ax.draw_artist(uav_dot)
+            ax.draw_artist(target_dot)
+            writer.stdin.write(canvas.buffer_rgba())
+    finally:
+        writer.stdin.close()
+        writer.wait()
+    print(video_file)
+
+    final_frame_image = save_final_frame(*recorded, mode, algorithm, dpi)
+    return video_file, final_frame_image
+
+
+@rc_context(STYLE)
+def final_frame_figure(uav_positions, target_positions, dpi=animation_dpi):
+    """Figure of the last video frame: the full paths, both dots and the labelled axes."""
+    uav_positions = np.asarray(uav_positions) / 100  # Convert to km
+    target_positions = np.asarray(target_positions) / 100  # Convert to km
+    last = min(len(target_positions), len(uav_positions)) - 1
+
+    fig = Figure(figsize=(10, 8), dpi=dpi)
+    canvas = FigureCanvasAgg(fig)
+    ax = fig.add_subplot()
+    ax.set_xlim(0, 100)  # Adjusted for km
+    ax.set_ylim(0, 100)  # Adjusted for km
+    ax.plot(target_positions[:last, 0], target_positions[:last, 1], 'r-', label='Target Trajectory')
+    ax.plot(uav_positions[:last, 0], uav_positions[:last, 1], 'b--', label='UAV Trajectory')
+    ax.plot(uav_positions[last, 0], uav_positions[last, 1], 'bo', label='UAV Position')
+    ax.plot(target_positions[last, 0], target_positions[last, 1], 'ro', label='Target Position')
+    ax.legend(fontsize=14)
+
+    # Final result plot with larger font sizes
+    ax.set_xlabel('X Axis (km)', fontsize=24)
+    ax.set_ylabel('Y Axis (km)', fontsize=24)
+    ax.set_title(f'UAV Tracking Target Trajectory', fontsize=28)
+    ax.grid(True)
 
-    def init():
-        target_line.set_data([], [])
-        uav_line.set_data([], [])
-        uav_dot.set_data([], [])
-        target_dot.set_data([], [])
-
-        # Set the legend in the init function with larger font size
-        ax.legend(fontsize=14)
-
-        return target_line, uav_line, uav_dot, target_dot
+    # Adjust tick label sizes
+    ax.tick_params(axis='both', which='major', labelsize=20)
+    return fig, canvas
 
-    def update(frame):
-        target_line.set_data(target_positions[:frame, 0], target_positions[:frame, 1])
-        uav_line.set_data(uav_positions[:frame, 0], uav_positions[:frame, 1])
-        uav_dot.set_data(uav_positions[frame, 0], uav_positions[frame, 1])
-        target_dot.set_data(target_positions[frame, 0], target_positions[frame, 1])
 
-        # Clear previous orientation arrows
-        for artist in reversed(ax.patches):
-            artist.remove()
+@rc_context(STYLE)
+def save_final_frame(uav_positions, target_positions, mode, algorithm, dpi=animation_dpi):
+    fig, _ = final_frame_figure(uav_positions, target_positions, dpi)
+    final_frame_image = f'experimental_pic/final_frame_{mode}_{algorithm}_setting.jpg'
+    fig.savefig(final_frame_image, dpi=dpi)  # Save with the specified dpi
+    print(f"Final frame image saved as {final_frame_image}")
+    return final_frame_image
 
-        return target_line, uav_line, uav_dot, target_dot
 
-    ani = animation.FuncAnimation(fig, update, frames=num_frames, init_func=init, blit=True, interval=20)
+@rc_context(STYLE)
+def final_frame_array(uav_positions, target_positions, dpi=animation_dpi):
+    """The final frame rendered to an (H, W, 4) uint8 RGBA array, for combine_images without a file round-trip."""
+    _, canvas = final_frame_figure(uav_positions, target_positions, dpi)
+    canvas.draw()
+    return np.asarray(canvas.buffer_rgba()).copy()
 
-    # Save animation as video file
-    ani.save(f'experimental_video/UAV_tracking_{mode}_{algorithm}_setting.mp4', writer='ffmpeg', fps=20)
-    print(f'experimental_video/UAV_tracking_{mode}_{algorithm}_setting.mp4')
 
-    # Show final result plot with larger font sizes
-    plt.xlabel('X Axis (km)', fontsize=24)
-    plt.ylabel('Y Axis (km)', fontsize=24)
-    plt.title(f'UAV Tracking Target Trajectory', fontsize=28)
-    plt.grid(True)
+def animation_video(target, uav, mode, algorithm, dpi=animation_dpi):
+    return render_video(np.asarray(uav.uav_positions), np.asarray(target.target_positions), mode, algorithm, dpi)
 
-    # Adjust tick label sizes
-    ax.tick_params(axis='both', which='major', labelsize=20)
 
-    final_frame_image = f'experimental_pic/final_frame_{mode}_{algorithm}_setting.jpg'
-    plt.savefig(final_frame_image, dpi=dpi)  # Save with the specified dpi
-    print(f"Final frame image saved as {final_frame_image}")
+def render_videos(jobs, num_workers=None, dpi=animation_dpi):
+    """Render several videos in worker processes; jobs are (uav_positions, target_positions, mode, algorithm)."""
+    num_workers = min(num_workers or os.cpu_count(), len(jobs))
+    if num_workers <= 1:
+        return [render_video(*job, dpi=dpi) for job in jobs]
+    with ProcessPoolExecutor(max_workers=num_workers) as executor:
+        futures = [executor.submit(render_video, *job, dpi=dpi) for job in jobs]
+        return [future.result() for future in futures]
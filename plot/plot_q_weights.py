@@ -1,6 +1,8 @@
 import matplotlib.pyplot as plt
 import numpy as np
 
+from bandit.q_history import QHistory
+
 
 def plot_q_weights(Q_histories, algorithms, output_file='experimental_pic/q_weights_comparison.jpg'):
     plt.figure(figsize=(14, 10))
@@ -11,14 +13,21 @@ def plot_q_weights(Q_histories, algorithms, output_file='experimental_pic/q_weig
     # Extract the number of algorithms
     num_algorithms = len(algorithms)
 
-    # Transpose Q_histories so that each row corresponds to a single algorithm over all rounds
-    Q_histories = np.array(Q_histories)
-    rounds = Q_histories.shape[0]
+    # Q_histories is a QHistory (read in place) or a list of per-round Q vectors
+    if isinstance(Q_histories, QHistory):
+        rounds = Q_histories.rounds()
+        weights = Q_histories.values()
+    else:
+        weights = np.asarray(Q_histories)
+        rounds = np.arange(weights.shape[0])
 
     # Iterate over each algorithm and plot its Q weight over time
     for i in range(num_algorithms):
-        weights = Q_histories[:, i]  # Extract the weights for algorithm i across all rounds
-        plt.plot(range(rounds), weights, label=algorithms[i], color=colors[i], linewidth=2.5)
+        plt.plot(rounds, weights[:, i], label=algorithms[i], color=colors[i], linewidth=2.5)
+        if isinstance(Q_histories, QHistory) and Q_histories.summary:
+            # Min / max band of each decimation window
+            plt.fill_between(rounds, Q_histories.minimum()[:, i], Q_histories.maximum()[:, i],
+                             color=colors[i], alpha=0.3)
 
     plt.xlabel('Rounds', fontsize=22, fontweight='bold')
     plt.ylabel('Q values', fontsize=22, fontweight='bold')
@@ -0,0 +1,99 @@
+from functools import partial
+
+import numpy as np
+
+from algorithm.expert_advice import ExpertAdvice
+from algorithm.batch_particle_filter import BatchParticleFilter
+from algorithm.previous_position import batch_previous_position
+from algorithm.trajectory_prediction import BatchTrajectoryPredictor
+from environment.Target_adversarial import Target_adversarial
+from environment.Target_tracking import Target_tracking
+from environment.UAV import UAV
+from environment.batch_environment import BatchTarget, BatchUAV
+from environment.trajectory_cache import TrajectoryCache
+from params import num_particles as default_num_particles
+from simulation.kernel import episode_length, run_episode
+from simulation.policies import ALGORITHMS, make_policy
+from simulation.profiling import NULL_TIMER
+
+
+def make_rngs(seeds):
+    # An int seed gives the same stream as np.random.seed(seed) on the scalar path
+    return [np.random.RandomState(seed) if isinstance(seed, (int, np.integer)) else seed for seed in seeds]
+
+
+def build_batch_experts(uav, target, rngs, num_particles=default_num_particles):
+    pf = BatchParticleFilter(num_particles, uav.uav_position, rngs)
+    tp = BatchTrajectoryPredictor(uav.batch_size)
+    return ExpertAdvice([batch_previous_position, pf.particle_filter, tp.trajectory_prediction],
+                        batch_size=uav.batch_size)
+
+
+def build_batch_environment(mode, uav_rngs, target_rngs, trajectory_cache=None):
+    # UAV i draws its start from uav_rngs[i], target i its start or trajectory from target_rngs[i]
+    uavs = [UAV(rng) for rng in uav_rngs]
+    if mode == 'Smooth Trajectory':
+        targets = [Target_tracking(uav.uav_position, rng, trajectory_cache) for uav, rng in zip(uavs, target_rngs)]
+        epoch = min(episode_length(target) for target in targets)
+        batch_target = BatchTarget(targets, epoch)
+    else:
+        targets = [Target_adversarial(uav.uav_position, rng) for uav, rng in zip(uavs, target_rngs)]
+        epoch = min(episode_length(target) for target in targets)
+        batch_target = BatchTarget(targets)
+    return BatchUAV(uavs, uav_rngs), batch_target, epoch
+
+
+def run_batch_experiments(seeds, mode='Smooth Trajectory', algorithms=ALGORITHMS, num_particles=default_num_particles,
+                          trajectory_cache=None, timer=NULL_TIMER, q_histories=None, q_stride=10):
+    """Run len(seeds) experiments of main2.run_single_experiment in lockstep.
+
+    Returns {algorithm: (len(seeds), epoch) array of cumulative distances}. Episode i consumes its random
+    stream (including the pre-drawn sampler blocks) in the same order as the scalar path after
+    np.random.seed(seeds[i]), so results match it up to floating point round-off in both modes.
+    trajectory_cache (a TrajectoryCache or a directory) reuses smooth trajectories generated by
+    earlier runs without changing any result. timer is passed to the kernel
+    with one section per algorithm (see simulation.profiling). If q_histories is a dict, it receives
+    {algorithm: (rows, len(seeds), M)} Exp4-IX weights of every q_stride-th round for each Exp4-IX policy.
+    """
+    rngs = make_rngs(seeds)
+    if isinstance(trajectory_cache, str):
+        trajectory_cache = TrajectoryCache(trajectory_cache)
+
+    batch_uav, batch_target, epoch = build_batch_environment(mode, rngs, rngs, trajectory_cache)
+    make_experts = partial(build_batch_experts, rngs=rngs, num_particles=num_particles)
+
+    cumulative_distances = {}
+    for algorithm in algorithms:
+        policy = make_policy(algorithm)
+        if q_histories is not None and hasattr(policy, 'history_stride'):
+            policy.history_stride = q_stride
+        cumulative_distances[algorithm] = run_episode(policy, batch_uav, batch_target,
+                                                      make_experts, epoch, timer=timer.section(algorithm))
+        if q_histories is not None and hasattr(policy, 'history_stride'):
+            q_histories[algorithm] = policy.exp4ix.Q_history.values()
+
+    return cumulative_distances
+
+
+def run_paired_experiments(streams, mode='Smooth Trajectory', algorithms=ALGORITHMS, num_particles=default_num_particles,
+                           trajectory_cache=None, timer=NULL_TIMER):
+    """Common-random-numbers version of run_batch_experiments.
+
+    streams[i] holds the (target, uav, particle filter) seeds of experiment i, e.g. from
+    simulation.monte_carlo.paired_streams. Every algorithm gets fresh generators from the same
+    seeds, so all of them start from the same UAV / target positions, follow the same smooth
+    trajectory and see the same target, action and particle filter random numbers frame by frame;
+    only the decisions of the policy differ. Returns {algorithm: (len(streams), epoch)} curves.
+    """
+    if isinstance(trajectory_cache, str):
+        trajectory_cache = TrajectoryCache(trajectory_cache)
+
+    cumulative_distances = {}
+    for algorithm in algorithms:
+        target_rngs, uav_rngs, pf_rngs = ([np.random.default_rng(seed) for seed in seeds] for seeds in zip(*streams))
+        batch_uav, batch_target, epoch = build_batch_environment(mode, uav_rngs, target_rngs, trajectory_cache)
+        make_experts = partial(build_batch_experts, rngs=pf_rngs, num_particles=num_particles)
+        cumulative_distances[algorithm] = run_episode(make_policy(algorithm), batch_uav, batch_target,
+                                                      make_experts, epoch, timer=timer.section(algorithm))
+
+    return cumulative_distances
@@ -0,0 +1,58 @@
+import numpy as np
+
+from algorithm.expert_advice import EXPERTS
+from environment.Target_tracking import Target_tracking
+from params import frame_num
+from simulation.profiling import NULL_TIMER
+
+
+def episode_length(target):
+    if isinstance(target, Target_tracking):
+        return min(frame_num, len(target.target_positions))
+    return frame_num
+
+
+def run_episode(policy, uav, target, make_experts, epoch, timer=NULL_TIMER):
+    """Run one episode of `policy` and return its cumulative distance curve.
+
+    Works unchanged on a single UAV / target and on the batched versions in
+    environment.batch_environment, in which case the curve is (N, epoch).
+    make_experts(uav, target) is called after the reset and returns an ExpertAdvice.
+    timer is a simulation.profiling.StageTimer to record per-stage wall time; the default
+    no-op timer keeps the cost of the hooks to a few function calls per frame.
+    """
+    uav.reset()
+    target.reset()
+    experts = make_experts(uav, target)
+    policy.reset(epoch, getattr(uav, 'batch_size', None))
+    if timer.enabled:
+        names = EXPERTS if len(experts.experts) == len(EXPERTS) else range(len(experts.experts))
+        experts.experts = [timer.wrap(f'expert: {name}', expert) for name, expert in zip(names, experts.experts)]
+
+    cumulative_distance = np.zeros(np.shape(uav.uav_orientation))
+    distances_over_time = np.empty(cumulative_distance.shape + (epoch,))
+
+    for i in range(epoch):
+        t = timer.start()
+        target.update(uav.uav_position)
+        t = timer.lap('target.update', t)
+        uav.update(target)
+        t = timer.lap('uav.update', t)
+
+        expert_advice = experts.compute(target, uav, policy.experts)
+        t = timer.lap('experts', t)
+        probs = policy.act(expert_advice)
+        t = timer.lap('policy.act', t)
+        uav.move(probs)
+        t = timer.lap('uav.move', t)
+
+        distance = np.linalg.norm(uav.uav_position - target.target_position, axis=-1)
+        cumulative_distance += distance / 100
+        distances_over_time[..., i] = cumulative_distance
+        t = timer.lap('distance', t)
+
+        policy.observe(uav, target, expert_advice)
+        timer.lap('policy.observe', t)
+
+    timer.add_frames(epoch * (getattr(uav, 'batch_size', None) or 1))
+    return distances_over_time
@@ -0,0 +1,391 @@
+import math
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+from environment.trajectory_cache import TrajectoryCache
+from simulation.batch_simulation import run_batch_experiments, run_paired_experiments
+from simulation.policies import ALGORITHMS
+from simulation.results_store import ResultsStore, run_params
+
+
+class RunningStats:
+    """Welford mean / variance over cumulative distance curves (or any equal-shape arrays), O(frames) memory."""
+
+    def __init__(self):
+        self.count = 0
+        self.mean = None
+        self.M2 = None
+
+    def update(self, curves):
+        for curve in np.atleast_2d(curves):
+            if self.mean is None:
+                self.mean = np.zeros(np.shape(curve))
+                self.M2 = np.zeros(np.shape(curve))
+            self.count += 1
+            delta = curve - self.mean
+            self.mean += delta / self.count
+            self.M2 += delta * (curve - self.mean)
+
+    def merge(self, other):
+        # Chan et al. pairwise combination of two partial accumulators
+        if other.count == 0:
+            return
+        if self.count == 0:
+            self.count, self.mean, self.M2 = other.count, other.mean.copy(), other.M2.copy()
+            return
+        count = self.count + other.count
+        delta = other.mean - self.mean
+        self.mean = self.mean + delta * other.count / count
+        self.M2 = self.M2 + other.M2 + delta ** 2 * self.count * other.count / count
+        self.count = count
+
+    def std(self):
+        # Population std, as np.std(..., axis=0) in run_monte_carlo_experiments
+        return np.sqrt(self.M2 / self.count)
+
+
+def experiment_rngs(root_seed, experiment_ids):
+    # Experiment i always gets child i of the root SeedSequence, whichever worker runs it
+    return [np.random.default_rng(np.random.SeedSequence(root_seed, spawn_key=(int(i),))) for i in experiment_ids]
+
+
+def t_interval(mean, M2, count, level):
+    # Student-t interval of a mean from Welford sums; M2 / (count - 1) is the sample variance
+    from scipy.stats import t
+
+    half_width = t.ppf((1 + level) / 2, count - 1) * np.sqrt(M2 / (count - 1) / count)
+    return mean, mean - half_width, mean + half_width
+
+
+# Independent random streams of every experiment in paired (common random numbers) runs
+STREAMS = ('target', 'uav', 'particle_filter')
+
+
+def paired_streams(root_seed, experiment_ids):
+    # Stream k of experiment i is child (i, k) of the root SeedSequence
+    return [tuple(np.random.SeedSequence(root_seed, spawn_key=(int(i), k)) for k in range(len(STREAMS)))
+            for i in experiment_ids]
+
+
+class PairedComparison:
+    """Paired differences between algorithms run on common random numbers.
+
+    differences is a RunningStats over the (A, A, epoch) curves curve[a] - curve[b] of every
+    experiment, so its std is that of the per-experiment difference, without the between-experiment
+    variance that both algorithms share.
+    """
+
+    def __init__(self, algorithms):
+        self.algorithms = list(algorithms)
+        self.stats = {algo: RunningStats() for algo in algorithms}
+        self.differences = RunningStats()
+
+    def update(self, cumulative_distances):
+        curves = np.stack([cumulative_distances[algo] for algo in self.algorithms], axis=1)
+        for algo, curve in zip(self.algorithms, curves.transpose(1, 0, 2)):
+            self.stats[algo].update(curve)
+        self.differences.update(curves[:, :, None] - curves[:, None])
+
+    def merge(self, other):
+        for algo in self.algorithms:
+            self.stats[algo].merge(other.stats[algo])
+        self.differences.merge(other.differences)
+
+    def confidence_interval(self, algo, reference, level=0.95, frame=-1):
+        """Mean of algo - reference at `frame` with its Student-t confidence interval."""
+        a, b = self.algorithms.index(algo), self.algorithms.index(reference)
+        differences = self.differences
+        return t_interval(differences.mean[a, b, frame], differences.M2[a, b, frame], differences.count, level)
+
+    def mean_confidence_interval(self, algo, level=0.95, frame=-1):
+        stats = self.stats[algo]
+        return t_interval(stats.mean[frame], stats.M2[frame], stats.count, level)
+
+    def variance_reduction(self, algo, reference, frame=-1):
+        # Var(a) + Var(b) over Var(a - b): how many times more independent experiments an unpaired
+        # comparison would need for the same interval width; inf when the differences do not vary
+        a, b = self.algorithms.index(algo), self.algorithms.index(reference)
+        unpaired = self.stats[algo].M2[frame] + self.stats[reference].M2[frame]
+        paired = self.differences.M2[a, b, frame]
+        return np.inf if paired == 0 else unpaired / paired
+
+    def report(self, reference, level=0.95, frame=-1):
+        print(f"Paired difference to {reference} at frame {frame} over {self.differences.count} experiments "
+              f"({100 * level:.3g} % CI):")
+        for algo in self.algorithms:
+            if algo == reference:
+                continue
+            mean, low, high = self.confidence_interval(algo, reference, level, frame)
+            print(f"    {algo:<32} {mean:>10.1f} [{low:>10.1f}, {high:>10.1f}]"
+                  f"  variance reduction {self.variance_reduction(algo, reference, frame):.1f}x")
+
+
+def run_shard(mode, root_seed, experiment_ids, algorithms, batch_size, cache_dir=None, results_dir=None, q_stride=10):
+    stats = {algo: RunningStats() for algo in algorithms}
+    trajectory_cache = None if cache_dir is None else TrajectoryCache(cache_dir)
+    store = None if results_dir is None else ResultsStore(results_dir)
+    for start in range(0, len(experiment_ids), batch_size):
+        batch_ids = experiment_ids[start:start + batch_size]
+        rngs = experiment_rngs(root_seed, batch_ids)
+        q_histories = None if store is None else {}
+        cumulative_distances = run_batch_experiments(rngs, mode, algorithms, trajectory_cache=trajectory_cache,
+                                                     q_histories=q_histories, q_stride=q_stride)
+        if store is not None:
+            store.append(batch_ids, cumulative_distances, q_histories)
+        for algo in algorithms:
+            stats[algo].update(cumulative_distances[algo])
+    return stats
+
+
+def run_paired_shard(mode, root_seed, experiment_ids, algorithms, batch_size, cache_dir=None, results_dir=None,
+                     common_random_numbers=True):
+    # Without common_random_numbers the experiments are those of run_shard, still compared pairwise
+    comparison = PairedComparison(algorithms)
+    trajectory_cache = None if cache_dir is None else TrajectoryCache(cache_dir)
+    store = None if results_dir is None else ResultsStore(results_dir)
+    for start in range(0, len(experiment_ids), batch_size):
+        batch_ids = experiment_ids[start:start + batch_size]
+        if common_random_numbers:
+            cumulative_distances = run_paired_experiments(paired_streams(root_seed, batch_ids), mode, algorithms,
+                                                          trajectory_cache=trajectory_cache)
+        else:
+            cumulative_distances = run_batch_experiments(experiment_rngs(root_seed, batch_ids), mode, algorithms,
+                                                         trajectory_cache=trajectory_cache)
+        if store is not None:
+            store.append(batch_ids, cumulative_distances)
+        comparison.update(cumulative_distances)
+    return comparison
+
+
+def store_stats(store, experiment_ids, algorithms):
+    # Statistics of the stored curves of the given experiments, read chunk by chunk from the memory maps
+    stats = {algo: RunningStats() for algo in algorithms}
+    for chunk in store.chunks():
+        selected = np.isin(store.load(chunk, 'experiment_ids'), experiment_ids)
+        for algo in algorithms:
+            stats[algo].update(store.load(chunk, f'distances_{store.algorithms.index(algo)}')[selected])
+    return stats
+
+
+def store_comparison(store, experiment_ids, algorithms):
+    # store_stats for a PairedComparison
+    comparison = PairedComparison(algorithms)
+    for chunk in store.chunks():
+        selected = np.isin(store.load(chunk, 'experiment_ids'), experiment_ids)
+        if selected.any():
+            comparison.update({algo: store.load(chunk, f'distances_{store.algorithms.index(algo)}')[selected]
+                               for algo in algorithms})
+    return comparison
+
+
+def paired_meta(mode, root_seed, algorithms, batch_size, common_random_numbers=True):
+    # ResultsStore settings of run_paired_monte_carlo and run_adaptive_monte_carlo, which can share a directory
+    return {'mode': mode, 'root_seed': root_seed, 'algorithms': list(algorithms), 'batch_size': batch_size,
+            'common_random_numbers': common_random_numbers, 'params': run_params()}
+
+
+def run_parallel_monte_carlo(mode='tracking', num_experiments=50, root_seed=1, num_workers=None, batch_size=10,
+                             algorithms=ALGORITHMS, cache_dir=None, results_dir=None, q_stride=10):
+    """Process-pool version of main2.run_monte_carlo_experiments.
+
+    Results depend only on root_seed and num_experiments; the worker count only changes the
+    order in which partial statistics are merged (round-off level differences). With cache_dir the
+    smooth target trajectories are kept on disk, so a rerun with the same root_seed skips generating them.
+    With results_dir every finished batch (curves and Exp4-IX Q every q_stride rounds) is appended to a
+    simulation.results_store.ResultsStore; rerunning with the same settings only runs the experiments
+    not stored yet, and the statistics are then taken over the stored curves.
+    """
+    num_workers = num_workers or os.cpu_count()
+    experiment_ids = np.arange(num_experiments)
+    remaining = experiment_ids
+    if results_dir is not None:
+        meta = {'mode': mode, 'root_seed': root_seed, 'algorithms': list(algorithms), 'batch_size': batch_size,
+                'q_stride': q_stride, 'params': run_params()}
+        store = ResultsStore(results_dir, meta)
+        store.clean()
+        remaining = np.setdiff1d(experiment_ids, store.completed())
+        print(num_experiments - len(remaining), "/", num_experiments, "already stored in", results_dir)
+    shards = [shard for shard in np.array_split(remaining, num_workers) if len(shard)]
+
+    stats = {algo: RunningStats() for algo in algorithms}
+    if shards:
+        with ProcessPoolExecutor(max_workers=len(shards)) as executor:
+            futures = [executor.submit(run_shard, mode, root_seed, shard, algorithms, batch_size,
+                                       cache_dir, results_dir, q_stride) for shard in shards]
+            for future in futures:
+                shard_stats = future.result()
+                for algo in algorithms:
+                    stats[algo].merge(shard_stats[algo])
+                print(num_experiments - len(remaining) + stats[algorithms[0]].count, "/", num_experiments)
+    if results_dir is not None:
+        stats = store_stats(store, experiment_ids, algorithms)
+
+    avg_distances = {algo: stats[algo].mean for algo in algorithms}
+    std_distances = {algo: stats[algo].std() for algo in algorithms}
+
+    return avg_distances, std_distances
+
+
+def load_monte_carlo_results(results_dir, algorithms=None):
+    """Mean and std curves of every experiment stored in results_dir, without running anything."""
+    store = ResultsStore(results_dir)
+    algorithms = algorithms or store.algorithms
+    stats = store_stats(store, store.completed(), algorithms)
+    return {algo: stats[algo].mean for algo in algorithms}, {algo: stats[algo].std() for algo in algorithms}
+
+
+def run_paired_monte_carlo(mode='tracking', num_experiments=50, root_seed=1, num_workers=None, batch_size=10,
+                           algorithms=ALGORITHMS, cache_dir=None, results_dir=None):
+    """run_parallel_monte_carlo on common random numbers (see run_paired_experiments).
+
+    Returns the mean and std curves as run_parallel_monte_carlo does, plus the PairedComparison
+    for confidence intervals of the differences between algorithms. results_dir works as in
+    run_parallel_monte_carlo (without Q histories): a rerun only runs the experiments not stored
+    yet. The store is the one run_adaptive_monte_carlo keeps, so either can continue the other's.
+    """
+    num_workers = num_workers or os.cpu_count()
+    experiment_ids = np.arange(num_experiments)
+    remaining = experiment_ids
+    if results_dir is not None:
+        store = ResultsStore(results_dir, paired_meta(mode, root_seed, algorithms, batch_size))
+        store.clean()
+        remaining = np.setdiff1d(experiment_ids, store.completed())
+        print(num_experiments - len(remaining), "/", num_experiments, "already stored in", results_dir)
+    shards = [shard for shard in np.array_split(remaining, num_workers) if len(shard)]
+
+    comparison = PairedComparison(algorithms)
+    if shards:
+        with ProcessPoolExecutor(max_workers=len(shards)) as executor:
+            futures = [executor.submit(run_paired_shard, mode, root_seed, shard, algorithms, batch_size,
+                                       cache_dir, results_dir) for shard in shards]
+            for future in futures:
+                comparison.merge(future.result())
+                print(num_experiments - len(remaining) + comparison.differences.count, "/", num_experiments)
+    if results_dir is not None:
+        comparison = store_comparison(store, experiment_ids, algorithms)
+
+    avg_distances = {algo: comparison.stats[algo].mean for algo in algorithms}
+    std_distances = {algo: comparison.stats[algo].std() for algo in algorithms}
+
+    return avg_distances, std_distances, comparison
+
+
+class SequentialStopping:
+    """When run_adaptive_monte_carlo stops, judged on the final cumulative distance after every round.
+
+    Never before min_experiments, always at max_experiments, and in between as soon as
+    - ci_width is given and every confidence interval is narrower than it: that of each
+      algorithm's mean or, with a reference, of each difference to the reference ('ci_width'), or
+    - reference is given (without ci_width) and the difference of every algorithm in `compare`
+      (default: all others) to it has an interval excluding 0, i.e. the ordering is decided ('decided').
+    Intervals are taken at level 1 - alpha / (looks * comparisons), Bonferroni over every check the
+    run can make, so stopping at the first decided look keeps the overall error rate below alpha.
+    reference and compare must name algorithms of the run, leaving at least one comparison
+    (ValueError otherwise, raised before any experiment runs).
+    """
+
+    def __init__(self, min_experiments=20, max_experiments=200, ci_width=None, reference=None, compare=None,
+                 alpha=0.05):
+        if ci_width is None and reference is None:
+            raise ValueError("SequentialStopping needs a ci_width, a reference algorithm or both")
+        if reference is not None and compare is not None and not [algo for algo in compare if algo != reference]:
+            raise ValueError(f"SequentialStopping compares nothing: compare holds only the reference {reference!r}")
+        self.min_experiments = max(min_experiments, 2)
+        self.max_experiments = max_experiments
+        self.ci_width = ci_width
+        self.reference = reference
+        self.compare = compare
+        self.alpha = alpha
+
+    def level(self, algorithms, round_size):
+        looks = max(1, math.ceil((self.max_experiments - self.min_experiments) / round_size) + 1)
+        return 1 - self.alpha / (looks * len(self.intervals(algorithms)))
+
+    def intervals(self, algorithms):
+        # Algorithms whose interval is checked, validated against the algorithms of the run
+        named = [algo for algo in [self.reference, *(self.compare or [])] if algo is not None]
+        unknown = [algo for algo in named if algo not in algorithms]
+        if unknown:
+            raise ValueError(f"SequentialStopping names algorithms that are not run: {unknown} "
+                             f"(running {list(algorithms)})")
+        if self.reference is None:
+            return list(algorithms)
+        intervals = [algo for algo in (self.compare or algorithms) if algo != self.reference]
+        if not intervals:
+            raise ValueError(f"SequentialStopping compares nothing: no algorithm other than {self.reference!r} is run")
+        return intervals
+
+    def check(self, comparison, level):
+        """The reason to stop now ('ci_width', 'decided', 'max_experiments') or None."""
+        count = comparison.differences.count
+        if count >= self.max_experiments:
+            return 'max_experiments'
+        if count < self.min_experiments:
+            return None
+        intervals = []
+        for algo in self.intervals(comparison.algorithms):
+            if self.reference is None:
+                intervals.append(comparison.mean_confidence_interval(algo, level))
+            else:
+                intervals.append(comparison.confidence_interval(algo, self.reference, level))
+        if self.ci_width is not None:
+            if all(high - low <= self.ci_width for _, low, high in intervals):
+                return 'ci_width'
+        elif all(low > 0 or high < 0 for _, low, high in intervals):
+            return 'decided'
+        return None
+
+
+def run_adaptive_monte_carlo(mode='tracking', root_seed=1, stopping=None, num_workers=None, batch_size=10,
+                             algorithms=ALGORITHMS, common_random_numbers=True, cache_dir=None, results_dir=None):
+    """Run rounds of num_workers * batch_size experiments until `stopping` (a SequentialStopping) says so.
+
+    Returns the mean and std curves, the PairedComparison of all experiments run and the stop
+    reason; comparison.differences.count is the number of experiments used. Experiments are
+    paired_streams / experiment_rngs ids 0, 1, ... as in the fixed-count runners. With results_dir
+    every batch is appended to a ResultsStore, and a rerun starts from the stored experiments.
+    With num_workers=1 everything runs in this process.
+    """
+    stopping = stopping or SequentialStopping()
+    num_workers = num_workers or os.cpu_count()
+    round_size = num_workers * batch_size
+    level = stopping.level(algorithms, round_size)
+    comparison = PairedComparison(algorithms)
+
+    completed = np.zeros(0, dtype=int)
+    if results_dir is not None:
+        store = ResultsStore(results_dir, paired_meta(mode, root_seed, algorithms, batch_size, common_random_numbers))
+        store.clean()
+        completed = store.completed()
+        comparison = store_comparison(store, completed, algorithms)
+    remaining = np.setdiff1d(np.arange(stopping.max_experiments), completed)
+
+    executor = ProcessPoolExecutor(max_workers=num_workers) if num_workers > 1 else None
+    try:
+        while True:
+            reason = stopping.check(comparison, level)
+            if reason is not None or len(remaining) == 0:
+                reason = reason or 'max_experiments'
+                break
+            experiment_ids, remaining = remaining[:round_size], remaining[round_size:]
+            shards = [shard for shard in np.array_split(experiment_ids, num_workers) if len(shard)]
+            args = (algorithms, batch_size, cache_dir, results_dir, common_random_numbers)
+            if executor is None:
+                results = [run_paired_shard(mode, root_seed, shard, *args) for shard in shards]
+            else:
+                results = [future.result() for future in
+                           [executor.submit(run_paired_shard, mode, root_seed, shard, *args) for shard in shards]]
+            for shard_comparison in results:
+                comparison.merge(shard_comparison)
+            print(comparison.differences.count, "experiments", flush=True)
+    finally:
+        if executor is not None:
+            executor.shutdown()
+    print(f"Stopped after {comparison.differences.count} experiments ({reason})")
+
+    avg_distances = {algo: comparison.stats[algo].mean for algo in algorithms}
+    std_distances = {algo: comparison.stats[algo].std() for algo in algorithms}
+
+    return avg_distances, std_distances, comparison, reason
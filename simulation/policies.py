@@ -0,0 +1,99 @@
+from algorithm.average_fusion import average_fusion
+from bandit.bandit_algorithm import BatchExp4IX, Exp4IX
+from bandit.q_history import QHistory
+from params import delta
+
+
+def advice_rows(experts):
+    # A basic slice when the experts are consecutive, so selecting their advice rows is a view of the
+    # reusable buffer rather than a new array every call
+    experts = tuple(experts)
+    if experts == tuple(range(experts[0], experts[-1] + 1)):
+        return slice(experts[0], experts[-1] + 1)
+    return list(experts)
+
+
+class Policy:
+    """Turns the per-frame expert advice into action probabilities.
+
+    The simulation kernel calls reset once per episode, then act and observe every frame.
+    `experts` lists the advice rows the policy reads. act / observe receive scalar or batched
+    (leading episode axis) state and must handle both.
+    """
+
+    experts = ()
+
+    def reset(self, epoch, batch_size=None):
+        pass
+
+    def act(self, expert_advice):
+        raise NotImplementedError
+
+    def observe(self, uav, target, expert_advice):
+        pass
+
+
+class SingleExpertPolicy(Policy):
+    def __init__(self, expert):
+        self.experts = (expert,)
+
+    def act(self, expert_advice):
+        return expert_advice[..., self.experts[0], :]
+
+
+class AverageFusionPolicy(Policy):
+    def __init__(self, experts=(0, 1, 2)):
+        self.experts = tuple(experts)
+        self.rows = advice_rows(self.experts)
+
+    def act(self, expert_advice):
+        return average_fusion(expert_advice[..., self.rows, :])
+
+
+class Exp4IXPolicy(Policy):
+    # Batched learners only record Q (every history_stride rounds) when this is set
+    history_stride = None
+
+    def __init__(self, experts=(0, 1, 2), k=4, delta=0.01):
+        self.experts = tuple(experts)
+        self.rows = advice_rows(self.experts)
+        self.k = k
+        self.delta = delta
+        self.exp4ix = None
+
+    def reset(self, epoch, batch_size=None):
+        if batch_size is None:
+            self.exp4ix = Exp4IX(n=epoch, k=self.k, M=len(self.experts), delta=self.delta)
+        else:
+            history = None
+            if self.history_stride is not None:
+                history = QHistory(epoch + 1, len(self.experts), stride=self.history_stride, batch_shape=(batch_size,))
+            self.exp4ix = BatchExp4IX(n=epoch, k=self.k, M=len(self.experts), delta=self.delta, batch_size=batch_size,
+                                      history=history)
+
+    def act(self, expert_advice):
+        return self.exp4ix.get_probs(expert_advice[..., self.rows, :])
+
+    def observe(self, uav, target, expert_advice):
+        self.exp4ix.update(uav, target, expert_advice[..., self.rows, :])
+
+
+POLICIES = {}
+
+
+def register_policy(name, factory):
+    """factory() must return a fresh Policy; registered names become selectable algorithms."""
+    POLICIES[name] = factory
+
+
+def make_policy(name):
+    return POLICIES[name]()
+
+
+register_policy('Previous Position Algorithm', lambda: SingleExpertPolicy(0))
+register_policy('Particle Filtering Algorithm', lambda: SingleExpertPolicy(1))
+register_policy('Trajectory Fitting Algorithm', lambda: SingleExpertPolicy(2))
+register_policy('Average Fusion Algorithm', lambda: AverageFusionPolicy((0, 1, 2)))
+register_policy('Exp4-IX Algorithm', lambda: Exp4IXPolicy((0, 1, 2), delta=delta))
+
+ALGORITHMS = list(POLICIES)
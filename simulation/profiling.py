@@ -0,0 +1,151 @@
+import csv
+import json
+from time import perf_counter
+
+
+class NullTimer:
+    """Timer used when instrumentation is off; every hook is a constant-time no-op."""
+
+    enabled = False
+
+    def section(self, name):
+        return self
+
+    def start(self):
+        return 0.0
+
+    def lap(self, stage, start):
+        return 0.0
+
+    def add_frames(self, frames):
+        pass
+
+    def wrap(self, stage, fn):
+        return fn
+
+
+NULL_TIMER = NullTimer()
+
+
+class StageTimer(NullTimer):
+    """Wall time and call counts of each stage of the frame loop, grouped by section (algorithm).
+
+    The kernel brackets every stage with start / lap. Stages recorded through wrap (single experts)
+    run inside a kernel stage, so they are excluded from the section total used for frames per second.
+    """
+
+    enabled = True
+
+    def __init__(self):
+        self.sections = {}
+        self.current = None
+        self.section('default')
+
+    def section(self, name):
+        self.current = self.sections.setdefault(name, {'frames': 0, 'stages': {}, 'nested': set()})
+        self.stages = self.current['stages']
+        return self
+
+    def start(self):
+        return perf_counter()
+
+    def lap(self, stage, start):
+        now = perf_counter()
+        record = self.stages.get(stage)
+        if record is None:
+            record = self.stages[stage] = [0.0, 0]
+        record[0] += now - start
+        record[1] += 1
+        return now
+
+    def add_frames(self, frames):
+        self.current['frames'] += frames
+
+    def wrap(self, stage, fn):
+        self.current['nested'].add(stage)
+
+        def timed(*args, **kwargs):
+            start = perf_counter()
+            result = fn(*args, **kwargs)
+            self.lap(stage, start)
+            return result
+        return timed
+
+    def rows(self):
+        """One dict per (section, stage): calls, total seconds, mean microseconds and share of the section."""
+        rows = []
+        for name, section in self.sections.items():
+            total = self.section_time(name)
+            for stage, (seconds, calls) in section['stages'].items():
+                rows.append({'section': name, 'stage': stage, 'calls': calls, 'total_s': seconds,
+                             'mean_us': seconds / calls * 1e6, 'share': seconds / total if total else 0.0})
+        return rows
+
+    def section_time(self, name):
+        section = self.sections[name]
+        return sum(seconds for stage, (seconds, _) in section['stages'].items() if stage not in section['nested'])
+
+    def fps(self):
+        # Frames of every episode in a batch count separately
+        return {name: section['frames'] / self.section_time(name)
+                for name, section in self.sections.items() if section['frames'] and self.section_time(name)}
+
+    def to_json(self, path):
+        fps = self.fps()
+        report = {name: {'frames': section['frames'], 'seconds': self.section_time(name), 'fps': fps.get(name),
+                         'stages': {row['stage']: {key: row[key] for key in ('calls', 'total_s', 'mean_us', 'share')}
+                                    for row in self.rows() if row['section'] == name}}
+                  for name, section in self.sections.items() if section['stages']}
+        with open(path, 'w') as f:
+            json.dump(report, f, indent=2)
+
+    def to_csv(self, path):
+        with open(path, 'w', newline='') as f:
+            writer = csv.DictWriter(f, fieldnames=['section', 'stage', 'calls', 'total_s', 'mean_us', 'share'])
+            writer.writeheader()
+            writer.writerows(self.rows())
+
+    def report(self):
+        fps = self.fps()
+        for name in self.sections:
+            if not self.sections[name]['stages']:
+                continue
+            print(f"{name}: {self.sections[name]['frames']} frames, {fps.get(name, 0):.0f} frames/s")
+            for row in self.rows():
+                if row['section'] == name:
+                    print(f"    {row['stage']:<40} {row['calls']:>8} calls {row['mean_us']:>10.1f} us"
+                          f" {100 * row['share']:>6.1f} %")
+
+
+def profile_call(fn, *args, profiler='cprofile', output=None, limit=25, **kwargs):
+    """Run fn(*args, **kwargs) under cProfile or, if installed, the pyinstrument sampling profiler.
+
+    cProfile stats are printed (top `limit` by cumulative time) and dumped to `output` (.prof) if
+    given; pyinstrument writes an HTML report to `output`. Returns fn's result.
+    """
+    if profiler == 'pyinstrument':
+        from pyinstrument import Profiler
+
+        sampler = Profiler()
+        sampler.start()
+        try:
+            result = fn(*args, **kwargs)
+        finally:
+            sampler.stop()
+        if output is not None:
+            with open(output, 'w') as f:
+                f.write(sampler.output_html())
+        print(sampler.output_text())
+        return result
+
+    if profiler != 'cprofile':
+        raise ValueError(f"Unknown profiler {profiler!r}, expected 'cprofile' or 'pyinstrument'")
+    import cProfile
+    import pstats
+
+    with cProfile.Profile() as prof:
+        result = fn(*args, **kwargs)
+    if output is not None:
+        prof.dump_stats(output)
+    pstats.Stats(prof).sort_stats('cumulative').print_stats(limit)
+    return result
@@ -0,0 +1,100 @@
+import json
+import os
+import shutil
+import tempfile
+
+import numpy as np
+
+import params
+
+STORE_VERSION = 1
+
+
+def run_params():
+    # Module-level settings of params.py that change what a run produces
+    return {name: value for name, value in vars(params).items()
+            if not name.startswith('_') and isinstance(value, (int, float, str))}
+
+
+class ResultsStore:
+    """Directory of Monte Carlo results, appended one batch of experiments at a time.
+
+    meta.json holds the run settings (mode, root_seed, algorithms, params.py values, ...). Every
+    finished batch is a chunk directory of .npy columns: experiment_ids (B,), distances_{a} (B, epoch)
+    for algorithm index a and, for Exp4-IX policies, q_{a} (rows, B, M). A chunk is written to a
+    temporary directory and renamed into place, so a killed run leaves only complete chunks, and
+    reopening the directory with the same settings resumes after them. Columns are loaded with
+    mmap_mode='r'.
+    """
+
+    def __init__(self, directory, meta=None):
+        self.directory = directory
+        os.makedirs(directory, exist_ok=True)
+        meta_path = os.path.join(directory, 'meta.json')
+        if meta is not None:
+            # Through JSON, so tuples and numpy scalars compare equal to what was stored
+            meta = json.loads(json.dumps(dict(meta, version=STORE_VERSION), default=str))
+        if os.path.exists(meta_path):
+            with open(meta_path) as f:
+                stored = json.load(f)
+            if meta is not None and meta != stored:
+                changed = sorted(key for key in set(meta) | set(stored) if meta.get(key) != stored.get(key))
+                raise ValueError(f"{directory} holds results of a different run (differs in {changed})")
+            meta = stored
+        elif meta is None:
+            raise ValueError(f"No results in {directory}")
+        else:
+            with open(meta_path + '.tmp', 'w') as f:
+                json.dump(meta, f, indent=2)
+            os.replace(meta_path + '.tmp', meta_path)
+        self.meta = meta
+        self.algorithms = meta['algorithms']
+
+    def clean(self):
+        # Leftovers of batches that were being written when a run was killed
+        for name in os.listdir(self.directory):
+            if name.startswith('.tmp_'):
+                shutil.rmtree(os.path.join(self.directory, name), ignore_errors=True)
+
+    def chunks(self):
+        return sorted(name for name in os.listdir(self.directory) if name.startswith('chunk_'))
+
+    def load(self, chunk, column):
+        return np.load(os.path.join(self.directory, chunk, f'{column}.npy'), mmap_mode='r')
+
+    def completed(self):
+        """Ids of the experiments already stored."""
+        ids = [self.load(chunk, 'experiment_ids') for chunk in self.chunks()]
+        return np.concatenate(ids) if ids else np.zeros(0, dtype=int)
+
+    def append(self, experiment_ids, cumulative_distances, q_histories=None):
+        """Store one batch: {algorithm: (B, epoch)} curves and optionally {algorithm: (rows, B, M)} Q histories."""
+        experiment_ids = np.asarray(experiment_ids)
+        columns = {'experiment_ids': experiment_ids}
+        for a, algorithm in enumerate(self.algorithms):
+            columns[f'distances_{a}'] = cumulative_distances[algorithm]
+            if q_histories and algorithm in q_histories:
+                columns[f'q_{a}'] = q_histories[algorithm]
+
+        temporary = tempfile.mkdtemp(prefix='.tmp_', dir=self.directory)
+        for column, values in columns.items():
+            np.save(os.path.join(temporary, f'{column}.npy'), np.asarray(values))
+        chunk = f'chunk_{experiment_ids.min():07d}_{experiment_ids.max():07d}'
+        os.replace(temporary, os.path.join(self.directory, chunk))
+        return chunk
+
+    def distances(self, algorithm):
+        """(experiments, epoch) curves of `algorithm` in experiment id order, cut to the shortest episode."""
+        a = self.algorithms.index(algorithm)
+        curves = [self.load(chunk, f'distances_{a}') for chunk in self.chunks()]
+        ids = self.completed()
+        epoch = min(curve.shape[1] for curve in curves)
+        return np.concatenate([curve[:, :epoch] for curve in curves])[np.argsort(ids, kind='stable')]
+
+    def q_history(self, algorithm):
+        """(rows, experiments, M) Q histories of `algorithm` in experiment id order."""
+        a = self.algorithms.index(algorithm)
+        histories = [self.load(chunk, f'q_{a}') for chunk in self.chunks()]
+        rows = min(len(history) for history in histories)
+        history = np.concatenate([history[:rows] for history in histories], axis=1)
+        return history[:, np.argsort(self.completed(), kind='stable')]
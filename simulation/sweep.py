@@ -0,0 +1,284 @@
+"""Run a grid of Monte Carlo experiments described by a sweep spec.
+
+    python -m simulation.sweep sweeps/example.json --workers 32
+
+The spec (JSON, or TOML on Python 3.11+) names the sweep and gives the run settings. Any value may be a
+list, and the sweep is the product of all lists:
+
+    {"name": "step_size", "output_dir": "experimental_results/sweeps",
+     "mode": ["Smooth Trajectory", "Adversarial Trajectory"], "root_seed": 1, "num_experiments": 100,
+     "batch_size": 10, "params": {"step_size": [20.0, 28.0, 36.0], "frame_num": 2000,
+                                  "num_particles": 1000, "delta": 0.01}}
+
+"params" overrides params.py. With a "stopping" block (the arguments of
+simulation.monte_carlo.SequentialStopping, plus "common_random_numbers", default true) every job
+runs adaptively in one worker, from min_experiments up to max_experiments (default: num_experiments)
+and stops early once its intervals are narrow enough or its comparison is decided:
+
+    "stopping": {"reference": "Exp4-IX Algorithm", "compare": ["Average Fusion Algorithm"], "min_experiments": 20}
+
+Every job gets a directory <output_dir>/<name>/<job id> holding its
+job.json and a simulation.results_store.ResultsStore; experiments already stored are not run
+again, so an interrupted sweep continues where it stopped when started again. Jobs are split into
+tasks of --task-size experiments, each run in a fresh worker process, because the simulation
+modules read params.py when they are imported. summary.csv lists the final cumulative distance of
+every job and algorithm, with the number of experiments each job used and why an adaptive job stopped.
+"""
+import argparse
+import csv
+import hashlib
+import itertools
+import json
+import multiprocessing
+import os
+import sys
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import numpy as np
+
+import params
+from simulation.results_store import ResultsStore, run_params
+
+# Keys of a spec that are settings of the sweep itself rather than swept job settings
+SWEEP_KEYS = ('name', 'output_dir')
+# Job settings that are only added to a job when given, so jobs without them keep their ids
+OPTIONAL_KEYS = ('stopping',)
+DEFAULTS = {'mode': 'Smooth Trajectory', 'root_seed': 1, 'num_experiments': 50, 'batch_size': 10, 'q_stride': 10,
+            'algorithms': None, 'params': {}}
+# Packages that bind params.py values when imported
+CORE_PACKAGES = ('environment', 'algorithm', 'bandit')
+
+
+def load_spec(path):
+    if path.endswith('.toml'):
+        import tomllib
+
+        with open(path, 'rb') as f:
+            return tomllib.load(f)
+    with open(path) as f:
+        return json.load(f)
+
+
+def grid(values):
+    # {key: value or list of values} -> one dict per combination
+    keys = list(values)
+    options = [values[key] if isinstance(values[key], list) else [values[key]] for key in keys]
+    return [dict(zip(keys, combination)) for combination in itertools.product(*options)]
+
+
+def expand(spec):
+    """The jobs of a spec: one dict of mode, root_seed, num_experiments, ... and params per grid point."""
+    unknown = set(spec) - set(DEFAULTS) - set(SWEEP_KEYS) - set(OPTIONAL_KEYS)
+    if unknown:
+        raise ValueError(f"Unknown keys in sweep spec: {sorted(unknown)}")
+    unknown = set(spec.get('params', {})) - set(run_params())
+    if unknown:
+        raise ValueError(f"Unknown params.py values in sweep spec: {sorted(unknown)}")
+
+    settings = {key: spec.get(key, default) for key, default in DEFAULTS.items() if key != 'params'}
+    settings.update({key: spec[key] for key in OPTIONAL_KEYS if key in spec})
+    if isinstance(settings['algorithms'], list) and all(isinstance(a, str) for a in settings['algorithms']):
+        # A plain list of names is one setting, not a swept axis
+        settings['algorithms'] = [settings['algorithms']]
+    jobs = []
+    for job in grid(settings):
+        for job_params in grid(spec.get('params', {})):
+            job['params'] = job_params
+            job['id'] = job_id(job)
+            jobs.append(dict(job))
+    return jobs
+
+
+def job_id(job):
+    # num_experiments is left out, so raising it later extends the same job
+    described = {key: value for key, value in job.items() if key not in ('id', 'num_experiments')}
+    digest = hashlib.sha1(json.dumps(described, sort_keys=True).encode()).hexdigest()[:10]
+    mode = job['mode'].split()[0].lower()
+    return '_'.join([mode] + [f'{key}-{value}' for key, value in sorted(job['params'].items())] + [digest])
+
+
+def apply_params(overrides):
+    """Set params.py values for this process, before any simulation module has read them."""
+    loaded = sorted(name for name in sys.modules if name.split('.')[0] in CORE_PACKAGES)
+    if loaded:
+        raise RuntimeError(f"params can only be changed before the simulation is imported ({loaded[0]} is loaded)")
+    for name, value in overrides.items():
+        setattr(params, name, value)
+
+
+def job_meta(job, algorithms):
+    # As written by run_parallel_monte_carlo, with the job's params in place of this process's
+    return {'mode': job['mode'], 'root_seed': job['root_seed'], 'algorithms': list(algorithms),
+            'batch_size': job['batch_size'], 'q_stride': job['q_stride'], 'params': dict(run_params(), **job['params'])}
+
+
+def run_task(job, experiment_ids, directory, cache_dir=None):
+    # Runs in a fresh worker process
+    apply_params(job['params'])
+    from simulation.monte_carlo import run_shard
+    from simulation.policies import ALGORITHMS
+
+    if job.get('stopping'):
+        return run_adaptive_task(job, directory, cache_dir)
+    run_shard(job['mode'], job['root_seed'], experiment_ids, job['algorithms'] or ALGORITHMS, job['batch_size'],
+              cache_dir, directory, job['q_stride'])
+    return len(experiment_ids)
+
+
+def max_experiments(job):
+    # The most experiments a job can use
+    if job.get('stopping'):
+        return job['stopping'].get('max_experiments', job['num_experiments'])
+    return job['num_experiments']
+
+
+def run_adaptive_task(job, directory, cache_dir=None):
+    from simulation.monte_carlo import SequentialStopping, run_adaptive_monte_carlo
+    from simulation.policies import ALGORITHMS
+
+    stopping = dict(job['stopping'])
+    common_random_numbers = stopping.pop('common_random_numbers', True)
+    stopping['max_experiments'] = max_experiments(job)
+    _, _, comparison, reason = run_adaptive_monte_carlo(
+        job['mode'], job['root_seed'], SequentialStopping(**stopping), num_workers=1, batch_size=job['batch_size'],
+        algorithms=job['algorithms'] or ALGORITHMS, common_random_numbers=common_random_numbers,
+        cache_dir=cache_dir, results_dir=directory)
+    # Marks the job as finished; a rerun skips it unless it ran out of experiments and may use more now
+    with open(os.path.join(directory, 'stopped.json'), 'w') as f:
+        json.dump({'experiments': comparison.differences.count, 'reason': reason}, f)
+    return comparison.differences.count
+
+
+def stop_record(directory):
+    # {'experiments': ..., 'reason': ...} of the last adaptive run of a job, or None
+    path = os.path.join(directory, 'stopped.json')
+    if not os.path.exists(path):
+        return None
+    with open(path) as f:
+        return json.load(f)
+
+
+def stop_reason(directory):
+    record = stop_record(directory)
+    return None if record is None else record['reason']
+
+
+def finished(job, directory):
+    # An adaptive job is done once its intervals or comparison settled, or it used all experiments allowed
+    record = stop_record(directory)
+    return record is not None and (record['reason'] in ('ci_width', 'decided')
+                                   or record['experiments'] >= max_experiments(job))
+
+
+def prepare(jobs, sweep_dir, algorithms, task_size=None):
+    """Create the job directories and return the (job, experiment ids, directory) tasks still to run."""
+    tasks = []
+    for job in jobs:
+        directory = os.path.join(sweep_dir, job['id'])
+        if job.get('stopping'):
+            # One task for the whole job; its worker creates the store and decides how many experiments to run
+            os.makedirs(directory, exist_ok=True)
+            with open(os.path.join(directory, 'job.json'), 'w') as f:
+                json.dump(job, f, indent=2)
+            if not finished(job, directory):
+                tasks.append((job, None, directory))
+            continue
+        store = ResultsStore(directory, job_meta(job, job['algorithms'] or algorithms))
+        store.clean()
+        with open(os.path.join(directory, 'job.json'), 'w') as f:
+            json.dump(job, f, indent=2)
+        remaining = np.setdiff1d(np.arange(job['num_experiments']), store.completed())
+        size = task_size or job['batch_size']
+        tasks += [(job, remaining[start:start + size], directory) for start in range(0, len(remaining), size)]
+    return tasks
+
+
+def write_summary(jobs, sweep_dir):
+    from simulation.monte_carlo import store_stats
+
+    path = os.path.join(sweep_dir, 'summary.csv')
+    param_names = sorted({name for job in jobs for name in job['params']})
+    with open(path, 'w', newline='') as f:
+        writer = csv.writer(f)
+        writer.writerow(['job', 'mode', 'root_seed'] + param_names +
+                        ['algorithm', 'experiments', 'final_mean', 'final_std', 'stop_reason'])
+        for job in jobs:
+            directory = os.path.join(sweep_dir, job['id'])
+            if not os.path.exists(os.path.join(directory, 'meta.json')):
+                continue
+            store = ResultsStore(directory)
+            # An adaptive job may have used more than num_experiments (up to its max_experiments)
+            experiment_ids = store.completed() if job.get('stopping') else np.arange(job['num_experiments'])
+            stats = store_stats(store, experiment_ids, store.algorithms)
+            for algorithm in store.algorithms:
+                if stats[algorithm].count == 0:
+                    continue
+                writer.writerow([job['id'], job['mode'], job['root_seed']] +
+                                [job['params'].get(name, '') for name in param_names] +
+                                [algorithm, stats[algorithm].count, stats[algorithm].mean[-1],
+                                 stats[algorithm].std()[-1], stop_reason(directory) or ''])
+    return path
+
+
+def run_sweep(spec, workers=None, task_size=None, cache_dir=None):
+    """Run every job of `spec` that is not complete yet and return the path of summary.csv."""
+    from simulation.policies import ALGORITHMS
+
+    jobs = expand(spec)
+    sweep_dir = os.path.join(spec.get('output_dir', 'experimental_results/sweeps'), spec['name'])
+    os.makedirs(sweep_dir, exist_ok=True)
+    with open(os.path.join(sweep_dir, 'spec.json'), 'w') as f:
+        json.dump(spec, f, indent=2)
+
+    tasks = prepare(jobs, sweep_dir, ALGORITHMS, task_size)
+    total = sum(max_experiments(job) if ids is None else len(ids) for job, ids, _ in tasks)
+    print(f"{len(jobs)} jobs, at most {total} experiments to run in {len(tasks)} tasks")
+
+    failed = 0
+    if tasks:
+        # spawn, one task per process: every task starts from a clean import with its own params
+        context = multiprocessing.get_context('spawn')
+        with ProcessPoolExecutor(max_workers=min(workers or os.cpu_count(), len(tasks)), mp_context=context,
+                                 max_tasks_per_child=1) as executor:
+            futures = {executor.submit(run_task, job, ids, directory, cache_dir): job['id']
+                       for job, ids, directory in tasks}
+            done = 0
+            for future in as_completed(futures):
+                try:
+                    done += future.result()
+                except Exception as e:
+                    failed += 1
+                    print(f"Task of job {futures[future]} failed: {e!r}")
+                print(done, "/", total, flush=True)
+
+    path = write_summary(jobs, sweep_dir)
+    print(f"Summary saved as {path}")
+    if failed:
+        raise RuntimeError(f"{failed} of {len(tasks)} tasks failed; run the sweep again to retry them")
+    return path
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('spec', help='sweep spec, .json or .toml')
+    parser.add_argument('--workers', type=int, default=None, help='worker processes (default: all cores)')
+    parser.add_argument('--task-size', type=int, default=None,
+                        help='experiments per worker task (default: the batch_size of the job)')
+    parser.add_argument('--cache-dir', default=None, help='directory of a shared TrajectoryCache')
+    parser.add_argument('--dry-run', action='store_true', help='only list the jobs')
+    args = parser.parse_args()
+
+    spec = load_spec(args.spec)
+    if args.dry_run:
+        for job in expand(spec):
+            print(job['id'], json.dumps({key: job[key] for key in ('mode', 'root_seed', 'num_experiments')}))
+        return
+    try:
+        run_sweep(spec, args.workers, args.task_size, args.cache_dir)
+    except RuntimeError as e:
+        print(e)
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()